@@ -0,0 +1,62 @@
+# Compares two benchmark result files written by benchmarks/run.py, e.g.
+#   python benchmarks/compare.py benchmarks/results/<baseline>.json benchmarks/results/<candidate>.json --threshold 1.1
+# Exits with status 1 when a benchmark got slower than the threshold allows, so it can gate a deploy
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path) as inputfile:
+        report = json.load(inputfile)
+    return report, {result_key(result): result for result in report["results"]}
+
+
+def result_key(result):
+    params = ",".join(f"{name}={value}" for name, value in sorted(result["params"].items()))
+    return result["benchmark"], result["size"], params
+
+
+def compare(baseline, candidate, threshold=1.1, min_delta=0.0):
+    """ Returns (key, baseline median, candidate median, ratio, regressed) for the benchmarks in both files
+
+    A benchmark regressed when its median grew by more than threshold and by more than min_delta seconds
+    """
+    rows = []
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key]["median_s"], candidate[key]["median_s"]
+        ratio = after / before if before > 0 else float("inf")
+        rows.append((key, before, after, ratio, ratio > threshold and after - before > min_delta))
+    return rows
+
+
+def main(args):
+    baseline_report, baseline = load_results(args.baseline)
+    candidate_report, candidate = load_results(args.candidate)
+    for name, report in (("baseline", baseline_report), ("candidate", candidate_report)):
+        dirty = " (uncommitted changes)" if report.get("dirty") else ""
+        print(f"{name:<9} {report.get('commit')}{dirty}  {report.get('timestamp')}  {report.get('platform')}")
+    if baseline_report.get("cpu_count") != candidate_report.get("cpu_count"):
+        print("Warning: the results were measured on machines with different core counts")
+
+    rows = compare(baseline, candidate, args.threshold, args.min_delta)
+    print(f"\n{'size':>4} {'benchmark':<28} {'params':<36} {'baseline ms':>12} {'candidate ms':>12} {'ratio':>7}")
+    for (benchmark, size, params), before, after, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{size:>4} {benchmark:<28} {params:<36} {before * 1000:12.2f} {after * 1000:12.2f} {ratio:7.2f}{flag}")
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        print(f"Only in {'baseline' if key in baseline else 'candidate'}: {' '.join(key)}")
+
+    regressions = sum(regressed for *_, regressed in rows)
+    print(f"\n{regressions} of {len(rows)} benchmarks slower than {args.threshold:.2f}x the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=1.1, help="largest allowed candidate/baseline median ratio")
+    parser.add_argument("--min-delta", type=float, default=0.0,
+                        help="ignore slowdowns smaller than this many seconds, for benchmarks near timer noise")
+    sys.exit(main(parser.parse_args()))
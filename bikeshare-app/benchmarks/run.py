@@ -0,0 +1,242 @@
+# Benchmarks of the bikeshare pipeline on synthetic data, run from bikeshare-app/, e.g.
+#   python benchmarks/run.py --sizes 10k 1m
+#   python benchmarks/compare.py benchmarks/results/<baseline>.json benchmarks/results/<candidate>.json
+# Results are written as JSON keyed by the git commit, so two commits can be compared before deploying
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+import xgboost as xg
+
+from bikeshare.configs.config import CFGLog
+from bikeshare.dataloader.dataloader import DataLoader
+from bikeshare.executor.inferrer import Inferrer
+from bikeshare.executor.registry import ModelRegistry
+from bikeshare.model.bikeshare_model import BikeshareXGBoost
+from bikeshare.utils.config import Config
+
+import synthetic_data
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+# The dashboard helpers import their package as utils, the way streamlit runs dashboard.py
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, os.pardir, "streamlit"))
+
+BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000]
+GROUPS = ["preprocess", "train", "infer", "dashboard"]
+
+
+def measure(fn, setup=None, repeat=5, max_time=30.0):
+    """ Runs fn once to warm up, then up to repeat timed runs while their total stays under max_time
+
+    setup, when given, runs untimed before every call and its result is passed to fn
+    """
+    fn(setup()) if setup else fn()
+    times = []
+    while len(times) < repeat and sum(times) < max_time:
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summary(benchmark, size, rows, times, **params):
+    """ One result entry; rows is the number of rows a single run processes, None for lookups """
+    median = statistics.median(times)
+    return {
+        "benchmark": benchmark,
+        "size": size,
+        "params": params,
+        "rows": rows,
+        "runs": len(times),
+        "times_s": times,
+        "min_s": min(times),
+        "median_s": median,
+        "mean_s": statistics.fmean(times),
+        "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rows_per_s": rows / median if rows and median > 0 else None
+    }
+
+
+def git_revision():
+    """ (commit, whether the working tree has uncommitted changes), None outside a git checkout """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.stdout.strip())
+
+
+def environment():
+    commit, dirty = git_revision()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "packages": {
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "scikit-learn": sklearn.__version__,
+            "xgboost": xg.__version__
+        }
+    }
+
+
+def benchmark_config(data_path, workdir, runtime="xgboost", n_estimators=None):
+    """ The shipped configuration pointed at the synthetic data, with every cache and output under workdir """
+    cfg = copy.deepcopy(CFGLog)
+    cfg["data"].update(
+        path=data_path,
+        cache_dir=os.path.join(workdir, "cache", ""),
+        matrix_cache_dir=None,
+        shard_dir=os.path.join(workdir, "shards", "")
+    )
+    cfg["output"].update(
+        output_path=os.path.join(workdir, "models", ""), export_onnx=runtime == "onnx", runtime=runtime, profile=False
+    )
+    if n_estimators is not None:
+        cfg["gradient_boosting"]["n_estimators"] = n_estimators
+    return cfg
+
+
+def quiet():
+    """ The pipeline reports progress with prints, which would otherwise be timed too """
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def bench_preprocess(size, raw, cfg, args):
+    data_config = Config.from_json(cfg).data
+    times = measure(lambda dataset: DataLoader.preprocess_data(data_config, dataset), setup=raw.copy,
+                    repeat=args.repeat, max_time=args.max_time)
+    return [summary("preprocess_data", size, len(raw), times)]
+
+
+def bench_train(size, raw, cfg, args):
+    model = BikeshareXGBoost(cfg)
+    with quiet():
+        model.load_data()
+        model.build()
+        # Training dominates at the larger sizes, it is repeated only as often as the time budget allows
+        times = measure(model.train, repeat=args.repeat, max_time=args.max_time)
+        model.export_model()
+    return [summary("train", size, model.X_train.shape[0], times,
+                    n_estimators=model.config.gradient_boosting.n_estimators)]
+
+
+def bench_infer(size, raw, cfg, args):
+    output_path = Config.from_json(cfg).output.output_path
+    if not os.path.isdir(output_path):
+        # Inference needs a model trained on this size, which the train benchmark exports when it runs first
+        with quiet():
+            model = BikeshareXGBoost(cfg)
+            model.load_data()
+            model.build()
+            model.train()
+            model.export_model()
+    inferrer = Inferrer(registry=ModelRegistry(output_path, runtime=args.runtime))
+
+    data_config = Config.from_json(cfg).data
+    features = DataLoader.drop_rows_and_columns(
+        data_config, DataLoader.create_dat_month_col(data_config, raw.copy())
+    )[data_config.X]
+    results = []
+    for batch_size in BATCH_SIZES:
+        # Rows repeat when the batch is larger than the data
+        batch = features.iloc[np.arange(batch_size) % len(features)].reset_index(drop=True)
+        with quiet():
+            times = measure(lambda: inferrer.xgb_infer(batch), repeat=args.repeat, max_time=args.max_time)
+        results.append(summary("xgb_infer", size, batch_size, times, batch_size=batch_size, runtime=args.runtime))
+    return results
+
+
+def bench_dashboard(size, raw, cfg, args):
+    from utils.dashboard_data import build_dashboard_data, extend_dashboard_data, get_day_rentals, get_month_rentals
+    from utils.dashboard_utils import preprocess_data
+
+    date_format = cfg["data"]["date_format"]
+    results = []
+    times = measure(lambda data: preprocess_data(data, date_format), setup=raw.copy,
+                    repeat=args.repeat, max_time=args.max_time)
+    results.append(summary("dashboard.preprocess_data", size, len(raw), times))
+    times = measure(lambda: build_dashboard_data(raw, date_format), repeat=args.repeat, max_time=args.max_time)
+    results.append(summary("dashboard.build", size, len(raw), times))
+
+    dashboard_data = build_dashboard_data(raw, date_format)
+    # A day of new hourly rows, as appended by the daily refresh
+    new_rows = raw.iloc[-24:]
+    times = measure(lambda: extend_dashboard_data(dashboard_data, new_rows, date_format),
+                    repeat=args.repeat, max_time=args.max_time)
+    results.append(summary("dashboard.extend", size, len(new_rows), times))
+    times = measure(lambda: get_month_rentals(dashboard_data, 6, 2018), repeat=args.repeat, max_time=args.max_time)
+    results.append(summary("dashboard.month_rentals", size, None, times))
+    day = datetime(2018, 6, 1).date()
+    times = measure(lambda: get_day_rentals(dashboard_data, day), repeat=args.repeat, max_time=args.max_time)
+    results.append(summary("dashboard.day_rentals", size, None, times))
+    return results
+
+
+BENCHMARKS = {
+    "preprocess": bench_preprocess,
+    "train": bench_train,
+    "infer": bench_infer,
+    "dashboard": bench_dashboard
+}
+
+
+def run(args):
+    report = {**environment(), "settings": vars(args), "results": []}
+    for size in args.sizes:
+        data_path = synthetic_data.write(
+            synthetic_data.SIZES[size], os.path.join(args.data_dir, f"seoul_{size}_seed{args.seed}.csv"), args.seed
+        )
+        workdir = os.path.join(args.work_dir, size)
+        # Caches and models left by an earlier run could come from other code
+        shutil.rmtree(workdir, ignore_errors=True)
+        cfg = benchmark_config(data_path, workdir, args.runtime, args.n_estimators)
+        raw = pd.read_csv(data_path)
+        for group in args.benchmarks:
+            results = BENCHMARKS[group](size, raw, cfg, args)
+            for result in results:
+                params = " ".join(f"{name}={value}" for name, value in result["params"].items())
+                print(f"{size:>4} {result['benchmark']:<28} {params:<36} median {result['median_s'] * 1000:10.2f} ms"
+                      f"  ({result['runs']} runs)")
+            report["results"] += results
+
+    output = args.output or os.path.join(BENCHMARKS_DIR, "results", f"{(report['commit'] or 'unknown')[:10]}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as outputfile:
+        json.dump(report, outputfile, indent=4)
+    print("Saved benchmark results to: ", output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, training, inference and the dashboard helpers")
+    parser.add_argument("--sizes", nargs="+", choices=list(synthetic_data.SIZES), default=list(synthetic_data.SIZES))
+    parser.add_argument("--benchmarks", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark, after one warm-up run")
+    parser.add_argument("--max-time", type=float, default=30.0, help="stop repeating once the timed runs took this long")
+    parser.add_argument("--n-estimators", type=int, default=None, help="defaults to the configured n_estimators")
+    parser.add_argument("--runtime", choices=["xgboost", "onnx"], default="xgboost")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(BENCHMARKS_DIR, "data"))
+    parser.add_argument("--work-dir", default=os.path.join(BENCHMARKS_DIR, "work"))
+    parser.add_argument("--output", default=None, help="defaults to benchmarks/results/<commit>.json")
+    run(parser.parse_args())
@@ -0,0 +1,90 @@
+# Synthetic data in the schema of data/SeoulBikeData_cleaned_cols.csv, e.g.
+#   python benchmarks/synthetic_data.py --rows 1000000 --output data/synthetic_1m.csv
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Named sizes used by the benchmarks
+SIZES = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000
+}
+
+# Same calendar as the real data; larger sizes repeat it, like more stations reporting the same hours
+START_DATE = "2017-12-01"
+N_DAYS = 365
+
+SEASONS = {12: "Winter", 1: "Winter", 2: "Winter", 3: "Spring", 4: "Spring", 5: "Spring",
+           6: "Summer", 7: "Summer", 8: "Summer", 9: "Autumn", 10: "Autumn", 11: "Autumn"}
+
+# Relative demand per hour of the day, with the commuting peaks of the real data
+HOUR_PROFILE = np.array([
+    0.35, 0.25, 0.18, 0.12, 0.08, 0.10, 0.30, 0.75, 1.40, 0.80, 0.55, 0.60,
+    0.70, 0.72, 0.75, 0.85, 1.00, 1.30, 1.80, 1.30, 1.05, 1.00, 0.90, 0.60
+])
+
+
+def generate(n_rows, seed=0):
+    """ Returns n_rows hourly rows with the raw columns, weather and demand loosely following the real data """
+    rng = np.random.default_rng(seed)
+    hours_index = np.arange(n_rows) % (N_DAYS * 24)
+    days = pd.date_range(START_DATE, periods=N_DAYS, freq="D")
+    day_index = hours_index // 24
+    hour = hours_index % 24
+    month = days.month.to_numpy()[day_index]
+
+    # Seasonal temperature cycle, coldest in January
+    day_of_year = days.dayofyear.to_numpy()[day_index]
+    temp = (12.5 - 14.5 * np.cos(2 * np.pi * (day_of_year - 15) / 365) + rng.normal(0, 4, n_rows)).round(1)
+    humidity = rng.integers(10, 99, n_rows)
+    rainfall = np.where(rng.random(n_rows) < 0.93, 0.0, rng.exponential(3.0, n_rows)).round(1)
+    snowfall = np.where((temp < 1) & (rng.random(n_rows) < 0.15), rng.exponential(1.0, n_rows), 0.0).round(1)
+    holiday = np.where(rng.random(n_rows) < 0.05, "Holiday", "No Holiday")
+    functioning_day = np.where(rng.random(n_rows) < 0.97, "Yes", "No")
+
+    demand = 900 * HOUR_PROFILE[hour] * np.clip(1 + (temp - 10) / 25, 0.15, 1.8)
+    demand *= np.where(rainfall > 0, 0.3, 1.0) * np.where(holiday == "Holiday", 0.8, 1.0)
+    rented_bike_count = np.clip(rng.normal(demand, 0.2 * demand + 10), 0, None).astype(np.int64)
+    # The real data has no rentals on non-functioning days
+    rented_bike_count[functioning_day == "No"] = 0
+
+    return pd.DataFrame({
+        # Formatting the distinct days once is much cheaper than formatting every row
+        "date": days.strftime("%d/%m/%Y").to_numpy()[day_index],
+        "rented_bike_count": rented_bike_count,
+        "hour": hour,
+        "temp": temp,
+        "humidity": humidity,
+        "wind_speed": rng.gamma(2.0, 0.9, n_rows).round(1),
+        "visibility": rng.integers(27, 2001, n_rows),
+        "dew_point_temp": (temp - (100 - humidity) / 5 + rng.normal(0, 1, n_rows)).round(1),
+        "solar_rad": np.where((hour >= 7) & (hour <= 18), rng.uniform(0, 3.5, n_rows), 0.0).round(2),
+        "rainfall": rainfall,
+        "snowfall": snowfall,
+        "seasons": pd.Series(month).map(SEASONS).to_numpy(),
+        "holiday": holiday,
+        "functioning_day": functioning_day
+    })
+
+
+def write(n_rows, path, seed=0):
+    """ Writes generate(n_rows, seed) to path as CSV, reusing the file if it was already generated """
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Written next to the target first, so an interrupted run never leaves a truncated file behind
+    generate(n_rows, seed).to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Seoul bikeshare data")
+    parser.add_argument("--rows", type=int, default=SIZES["10k"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="data/synthetic.csv")
+    args = parser.parse_args()
+    print("Saved synthetic data to: ", write(args.rows, args.output, args.seed))
@@ -1,6 +1,14 @@
 CFGLog = {
     "data": {
         "path": "./data/SeoulBikeData_cleaned_cols.csv",
+        "date_format": "%d/%m/%Y",
+        # Typed Parquet copy of the CSV, set to None to always read the CSV
+        "cache_dir": "./data/cache/",
+        "chunksize": 500000,
+        # Preprocessed (X, y) shards for external memory training
+        "shard_dir": "./data/shards/",
+        # Split and transformed matrices shared by every model, set to None to preprocess on each run
+        "matrix_cache_dir": "./data/cache/matrices/",
         "X": [
             'hour', 'temp',
             'humidity', 'wind_speed', 
@@ -16,11 +24,83 @@ CFGLog = {
         "n_estimators": 300,
         "max_depth": 7,
         "subsample": 0.8,
-        "learning_rate": 0.1
+        "learning_rate": 0.1,
+        # Train from on-disk shards instead of one in-memory matrix
+        "external_memory": False,
+        # Trees added to the current booster by BikeshareXGBoost.update for each batch of new data
+        "warm_start_estimators": 50
+    },
+    "search": {
+        # Space of the gradient_boosting parameters used by BikeshareXGBoost.train
+        "space": {
+            "max_depth": [3, 5, 7, 9],
+            "learning_rate": [0.03, 0.05, 0.1, 0.2],
+            "subsample": [0.6, 0.8, 1.0]
+        },
+        "n_trials": 27,
+        # None uses every core
+        "n_workers": None,
+        # Successive halving: n_estimators grows from min_estimators to gradient_boosting.n_estimators
+        "min_estimators": 30,
+        "reduction_factor": 3,
+        "early_stopping_rounds": 20,
+        "validation_size": 0.2
+    },
+    "cross_validation": {
+        # Rolling-origin folds: the last n_folds blocks of test_hours, each trained on the hours before it
+        "n_folds": 5,
+        "test_hours": 720,
+        # Hours left out between the training and test hours of a fold
+        "gap_hours": 0,
+        # None trains on all earlier hours (expanding window), a number only on the last max_train_hours
+        "max_train_hours": None,
+        # None uses one process per fold, up to the number of cores
+        "n_workers": None
+    },
+    "forecasting": {
+        # Hourly rentals per station, one row per station and hour with the weather of that hour
+        "path": "./data/station_rentals.csv",
+        "station": "station",
+        "datetime": "datetime",
+        "y": "rented_bike_count",
+        # Weather of the forecast hour, taken from a weather forecast when predicting
+        "exog": ['temp', 'humidity', 'wind_speed', 'rainfall', 'snowfall'],
+        # Rentals this many hours before the forecast hour (1 is the last observed hour)
+        "lags": [1, 2, 3, 24, 168],
+        # Mean rentals over the last window hours
+        "windows": [24, 168],
+        # Rentals at the same hour of the last observed day and week
+        "periods": [24, 168],
+        # Every forecast covers the next 1..horizon hours
+        "horizon": 168,
+        # A training forecast is made every origin_stride hours, each with every horizon
+        "origin_stride": 24,
+        # The last test_hours are held out for evaluation
+        "test_hours": 672,
+        # Stations are processed in groups of at most this many feature rows, bounding memory
+        "max_group_rows": 2000000,
+        "shard_dir": "./data/forecast_shards/"
+    },
+    "serving": {
+        # Concurrent requests are coalesced until the batch holds max_batch_size records
+        # or max_latency_ms has passed since its first request
+        "max_batch_size": 1024,
+        "max_latency_ms": 2.0
     },
     "output": {
         "output_path": "./data/exported_models/",
-        "xgb_model": "XGBoost_2025-01-24_14-51-46.pkl",
+        # "latest" serves the newest saved XGBoost model, or pin one e.g. "XGBoost_2025-01-24_14-51-46.pkl"
+        "xgb_model": "latest",
+        "max_resident_models": 2,
+        "poll_interval": 5.0,
+        # Also save XGBoost models as one ONNX graph with the preprocessing (needs onnx, checked with onnxruntime)
+        "export_onnx": True,
+        # "xgboost" serves the booster, "onnx" the exported graph through onnxruntime
+        "runtime": "xgboost",
+        # Write wall/CPU time, peak RSS and rows of every pipeline stage to <model>_profile_<run>.json,
+        # with cprofile also the cProfile statistics to <model>_profile_<run>.prof
+        "profile": False,
+        "cprofile": False
     }
 }
 
@@ -0,0 +1,160 @@
+import glob
+import io
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from bikeshare.utils.hashing import appended_hash, file_hash
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+# Text columns of the raw data stored as categoricals
+CATEGORY_COLUMNS = ["seasons", "holiday", "functioning_day"]
+
+
+def set_column_types(data_config, dataset):
+    """ Parses date with the configured format, adds day/month and turns the text columns into categoricals """
+    dataset["date"] = pd.to_datetime(dataset["date"], format=data_config.date_format)
+    dataset["day"] = pd.Categorical(dataset["date"].dt.day_name(), categories=DAY_NAMES)
+    dataset["month"] = pd.Categorical(dataset["date"].dt.month_name(), categories=MONTH_NAMES)
+    for column in CATEGORY_COLUMNS:
+        if column in dataset:
+            dataset[column] = dataset[column].astype("category")
+    return dataset
+
+
+class ColumnarCache:
+    """ Typed Parquet copy of the CSV at data_config.path, stored as parts of at most data_config.chunksize rows
+
+    The cache is rebuilt when the CSV changes. A matching mtime and size is trusted as is; otherwise the
+    file's sha256 decides, so touching the CSV without changing it does not trigger a rebuild. Rows added
+    with append go to the CSV and to a new part, leaving the existing parts untouched.
+    """
+
+    def __init__(self, data_config):
+        self.data_config = data_config
+        self.source = data_config.path
+        self.cache_path = os.path.join(data_config.cache_dir, Path(self.source).stem)
+        self.parts_path = os.path.join(self.cache_path, "parts")
+        self.meta_path = os.path.join(self.cache_path, "meta.json")
+
+    @staticmethod
+    def available():
+        """ The cache needs pyarrow; without it DataLoader reads the CSV directly """
+        return pq is not None
+
+    def read_meta(self):
+        if not os.path.isfile(self.meta_path):
+            return None
+        with open(self.meta_path) as inputfile:
+            return json.load(inputfile)
+
+    def write_meta(self, meta, path=None):
+        with open(path or self.meta_path, "w") as outputfile:
+            json.dump(meta, outputfile, indent=4)
+
+    def is_valid(self):
+        """ True when the cached parts were built from the current CSV contents """
+        meta = self.read_meta()
+        if meta is None:
+            return False
+        stat = os.stat(self.source)
+        if meta["mtime_ns"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+            return True
+        if meta["size"] == stat.st_size and meta["sha256"] == file_hash(self.source):
+            meta["mtime_ns"] = stat.st_mtime_ns
+            self.write_meta(meta)
+            return True
+        return False
+
+    def build(self):
+        """ Converts the CSV chunk by chunk into typed Parquet parts """
+        stat = os.stat(self.source)
+        tmp_path = self.cache_path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(os.path.join(tmp_path, "parts"))
+
+        rows = 0
+        for index, chunk in enumerate(pd.read_csv(self.source, chunksize=self.data_config.chunksize)):
+            chunk = set_column_types(self.data_config, chunk)
+            chunk.to_parquet(os.path.join(tmp_path, "parts", f"part-{index:05d}.parquet"), index=False)
+            rows += len(chunk)
+
+        self.write_meta(
+            {
+                "source": self.source,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "sha256": file_hash(self.source),
+                "rows": rows
+            },
+            path=os.path.join(tmp_path, "meta.json")
+        )
+        shutil.rmtree(self.cache_path, ignore_errors=True)
+        os.replace(tmp_path, self.cache_path)
+        print("Built columnar cache at: ", self.cache_path)
+
+    def ensure(self):
+        if not self.is_valid():
+            self.build()
+
+    def append(self, dataset):
+        """ Appends raw rows to the CSV and stores them as a new part, returns them typed
+        
+        The rows are parsed back from the appended CSV text, so the new part holds exactly what a rebuild
+        would. The stored sha256 becomes a hash chained over the appends (see appended_hash).
+        """
+        self.ensure()
+        meta = self.read_meta()
+        columns = list(pd.read_csv(self.source, nrows=0).columns)
+        
+        appended = dataset[columns].to_csv(header=False, index=False, date_format=self.data_config.date_format)
+        appended = appended.encode()
+        with open(self.source, "rb+") as outputfile:
+            outputfile.seek(0, os.SEEK_END)
+            if outputfile.tell() > 0:
+                outputfile.seek(-1, os.SEEK_END)
+                if outputfile.read(1) != b"\n":
+                    appended = b"\n" + appended
+            outputfile.write(appended)
+        
+        typed = set_column_types(self.data_config, pd.read_csv(io.BytesIO(appended), names=columns))
+        typed.to_parquet(os.path.join(self.parts_path, f"part-{len(self.parts()):05d}.parquet"), index=False)
+        
+        stat = os.stat(self.source)
+        meta.update({
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": appended_hash(meta["sha256"], appended),
+            "rows": meta["rows"] + len(typed)
+        })
+        self.write_meta(meta)
+        print(f"Appended {len(typed)} rows to: ", self.cache_path)
+        return typed
+    
+    def parts(self):
+        return sorted(glob.glob(os.path.join(self.parts_path, "*.parquet")))
+
+    def load(self, columns=None):
+        """ Loads the whole typed dataset; categories of the parts are unified by pyarrow """
+        self.ensure()
+        return pd.read_parquet(self.parts_path, columns=columns)
+
+    def iter_chunks(self, chunksize=None, columns=None):
+        """ Yields the typed dataset in DataFrames of at most chunksize rows """
+        self.ensure()
+        chunksize = chunksize or self.data_config.chunksize
+        for part in self.parts():
+            for batch in pq.ParquetFile(part).iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
@@ -1,26 +1,55 @@
+import os
+import shutil
+
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
+from pandas.api.types import union_categoricals
 
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
 
+from bikeshare.dataloader.columnar_cache import ColumnarCache, set_column_types
+from bikeshare.dataloader.preprocessor import Preprocessor
+from bikeshare.dataloader.matrix_cache import MatrixCache
+from bikeshare.utils.hashing import file_hash
+from bikeshare.utils.profiling import stage
+
 class DataLoader:
     """ Data loading and preprocessing class """
     
     @staticmethod
     def load_data(data_config):
-        """ Load data from file """
-        df = pd.read_csv(data_config.path)
+        """ Load data from file, through the typed columnar cache when one is configured """
+        if data_config.cache_dir and ColumnarCache.available():
+            with stage("read_parquet") as record:
+                df = ColumnarCache(data_config).load()
+                record["rows"] = len(df)
+            return df
+        with stage("read_csv") as record:
+            df = pd.read_csv(data_config.path)
+            record["rows"] = len(df)
         return df
     
+    @staticmethod
+    def iter_data(data_config, chunksize=None):
+        """ Yield the typed data in chunks of at most chunksize rows, keeping memory bounded """
+        chunksize = chunksize or data_config.chunksize
+        if data_config.cache_dir and ColumnarCache.available():
+            yield from ColumnarCache(data_config).iter_chunks(chunksize)
+            return
+        for chunk in pd.read_csv(data_config.path, chunksize=chunksize):
+            yield set_column_types(data_config, chunk)
+    
     @staticmethod
     def create_dat_month_col(data_config, dataset=None):
         """ Create month column """
-        dataset['date'] = pd.to_datetime(dataset['date'], dayfirst=True)
-        dataset["day"] = dataset["date"].dt.day_name()
-        dataset['month'] = dataset['date'].dt.month_name()
+        # Data from the columnar cache already has typed date, day and month columns
+        if not pd.api.types.is_datetime64_any_dtype(dataset['date']):
+            with stage("parse_dates", rows=len(dataset)):
+                dataset = set_column_types(data_config, dataset)
         return dataset
     
     @staticmethod
@@ -46,7 +75,8 @@ class DataLoader:
         random_state = data_config.random_state
         
         # Splitting the dataset
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+        with stage("split", rows=len(X)):
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
         
         X_train_num = X_train.select_dtypes(include=[np.number]).columns
         X_train_cat = X_train.select_dtypes(exclude=[np.number]).columns
@@ -62,14 +92,268 @@ class DataLoader:
             ]
         )
         
-        X_train = col_transformer.fit_transform(X_train)
-        X_test = col_transformer.transform(X_test)
+        with stage("fit_transform", rows=len(X_train)):
+            X_train = col_transformer.fit_transform(X_train)
+        with stage("transform", rows=len(X_test)):
+            X_test = col_transformer.transform(X_test)
         y_train = np.array(y_train)
         y_test = np.array(y_test)
         
         return (
             X, y, X_train, X_test, y_train, y_test, col_transformer
         )
+    
+    @staticmethod
+    def load_time_ordered_data(data_config):
+        """ Load the cleaned data sorted by date and hour, transformed into one dense float32 matrix
+        
+        Returns (X, y, hour of every row counted from the first day, preprocessor). The scaling and vocabularies
+        are fitted on all rows; min-max scaling does not move the splits of tree models, so time-series folds
+        do not leak through it.
+        """
+        dataset = DataLoader.create_dat_month_col(data_config, DataLoader.load_data(data_config))
+        dataset = dataset.sort_values(["date", "hour"], kind="stable")
+        hours = (dataset["date"] - dataset["date"].iloc[0]) // pd.Timedelta(hours=1) + dataset["hour"]
+        dataset = DataLoader.drop_rows_and_columns(data_config, dataset)
+        
+        X = dataset[data_config.X]
+        col_transformer = ColumnTransformer(
+            [
+                ("num", MinMaxScaler(), X.select_dtypes(include=[np.number]).columns),
+                ("cat", OneHotEncoder(), X.select_dtypes(exclude=[np.number]).columns)
+            ]
+        )
+        preprocessor = Preprocessor.from_col_transformer(col_transformer.fit(X))
+        with stage("transform", rows=len(X)):
+            X = preprocessor.transform(X)
+        y = dataset[data_config.y].to_numpy(dtype=np.float32)
+        return X, y, hours.loc[dataset.index].to_numpy(), preprocessor
+    
+    @staticmethod
+    def data_hash(data_config):
+        """ sha256 of the raw data file, taken from the columnar cache metadata when available """
+        if data_config.cache_dir and ColumnarCache.available():
+            cache = ColumnarCache(data_config)
+            cache.ensure()
+            return cache.read_meta()["sha256"]
+        return file_hash(data_config.path)
+    
+    @staticmethod
+    def row_count(data_config):
+        """ Number of rows in the data file """
+        if data_config.cache_dir and ColumnarCache.available():
+            cache = ColumnarCache(data_config)
+            cache.ensure()
+            return cache.read_meta()["rows"]
+        with open(data_config.path, "rb") as inputfile:
+            return sum(block.count(b"\n") for block in iter(lambda: inputfile.read(1 << 20), b"")) - 1
+    
+    @staticmethod
+    def load_preprocessed_data(data_config):
+        """ Load and preprocess data, reusing cached matrices while the data and the data config are unchanged
+        
+        Returns the same tuple as preprocess_data, but with the fitted Preprocessor in place of the ColumnTransformer
+        whether or not the matrices came from the cache
+        """
+        if not data_config.matrix_cache_dir:
+            dataset = DataLoader.load_data(data_config)
+            X, y, X_train, X_test, y_train, y_test, col_transformer = \
+                DataLoader.preprocess_data(data_config, dataset=dataset)
+            return X, y, X_train, X_test, y_train, y_test, Preprocessor.from_col_transformer(col_transformer)
+        
+        cache = MatrixCache(data_config, DataLoader.data_hash(data_config))
+        entry = cache.get_loaded()
+        if entry is not None:
+            return entry
+        
+        if cache.on_disk():
+            with stage("load_matrix_cache") as record:
+                matrices, preprocessor, X, y = cache.load(data_config)
+                record["rows"] = len(X)
+            entry = (
+                X, y, matrices["X_train"], matrices["X_test"], matrices["y_train"], matrices["y_test"], preprocessor
+            )
+        else:
+            dataset = DataLoader.load_data(data_config)
+            X, y, X_train, X_test, y_train, y_test, col_transformer = \
+                DataLoader.preprocess_data(data_config, dataset=dataset)
+            preprocessor = Preprocessor.from_col_transformer(col_transformer)
+            cache.save(
+                {"X_train": X_train, "X_test": X_test, "y_train": y_train, "y_test": y_test}, preprocessor, X, y
+            )
+            entry = (X, y, X_train, X_test, y_train, y_test, preprocessor)
+        cache.put_loaded(entry)
+        return entry
+    
+    @staticmethod
+    def split_chunks(data_config):
+        """ Yield (train, test) frames per chunk of the cleaned data, split row-wise with a seeded generator """
+        rng = np.random.default_rng(data_config.random_state)
+        for chunk in DataLoader.iter_data(data_config):
+            chunk = DataLoader.create_dat_month_col(data_config, chunk)
+            chunk = DataLoader.drop_rows_and_columns(data_config, chunk)
+            is_test = rng.random(len(chunk)) < data_config.test_size
+            yield chunk[~is_test], chunk[is_test]
+    
+    @staticmethod
+    def fit_preprocessor_streaming(data_config):
+        """ Fit the min-max scaling and one-hot vocabularies on the training rows, one chunk at a time """
+        num_columns = cat_columns = None
+        data_min = data_max = None
+        categories = {}
+        for train, _ in DataLoader.split_chunks(data_config):
+            if train.empty:
+                continue
+            X = train[data_config.X]
+            if num_columns is None:
+                num_columns = list(X.select_dtypes(include=[np.number]).columns)
+                cat_columns = list(X.select_dtypes(exclude=[np.number]).columns)
+                categories = {column: set() for column in cat_columns}
+            
+            values = X[num_columns].to_numpy(dtype=np.float64)
+            chunk_min, chunk_max = values.min(axis=0), values.max(axis=0)
+            data_min = chunk_min if data_min is None else np.minimum(data_min, chunk_min)
+            data_max = chunk_max if data_max is None else np.maximum(data_max, chunk_max)
+            for column in cat_columns:
+                categories[column].update(X[column].dropna().unique().tolist())
+        
+        # Same scale/offset as MinMaxScaler, constant columns keep a range of 1
+        data_range = data_max - data_min
+        data_range[data_range == 0.0] = 1.0
+        scale = 1.0 / data_range
+        offset = -data_min * scale
+        return Preprocessor(num_columns, scale, offset, cat_columns, [sorted(categories[column]) for column in cat_columns])
+    
+    @staticmethod
+    def preprocess_data_streaming(data_config, shard_dir):
+        """ Preprocess data chunk by chunk into float32 (X, y) shards on disk
+        
+        Returns the fitted preprocessor and the paths of the train and test shards
+        """
+        with stage("fit_streaming"):
+            preprocessor = DataLoader.fit_preprocessor_streaming(data_config)
+        
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        os.makedirs(shard_dir)
+        train_shards, test_shards = [], []
+        with stage("write_shards") as record:
+            rows = 0
+            for index, (train, test) in enumerate(DataLoader.split_chunks(data_config)):
+                for split, shards, name in ((train, train_shards, "train"), (test, test_shards, "test")):
+                    if split.empty:
+                        continue
+                    shard_path = os.path.join(shard_dir, f"{name}-{index:05d}.npz")
+                    np.savez(
+                        shard_path,
+                        X=preprocessor.transform(split[data_config.X]),
+                        y=split[data_config.y].to_numpy(dtype=np.float32)
+                    )
+                    shards.append(shard_path)
+                    rows += len(split)
+            record["rows"] = rows
+        
+        return preprocessor, train_shards, test_shards
+    
+    @staticmethod
+    def append_data(data_config, dataset):
+        """ Append new raw rows to the data file (and its columnar cache), returns them typed """
+        if data_config.cache_dir and ColumnarCache.available():
+            return ColumnarCache(data_config).append(dataset)
+        
+        columns = list(pd.read_csv(data_config.path, nrows=0).columns)
+        dataset[columns].to_csv(data_config.path, mode="a", header=False, index=False, date_format=data_config.date_format)
+        return set_column_types(data_config, dataset[columns].copy())
+    
+    @staticmethod
+    def split_new_rows(data_config, dataset, seed):
+        """ Split appended rows into (train, test) like split_chunks, seeded per append so batches differ """
+        rng = np.random.default_rng([data_config.random_state, seed])
+        is_test = rng.random(len(dataset)) < data_config.test_size
+        return dataset[~is_test], dataset[is_test]
+    
+    @staticmethod
+    def extend_preprocessed_data(data_config, previous_hash, train, test):
+        """ Extend the cached matrices of the previous data version with the appended rows
+        
+        The preprocessor fitted on the previous data is reused, so the rows are only transformed and categories
+        it has not seen are encoded as all zeros. Returns (matrices, preprocessor, X, y) for MatrixCache.save, or
+        None when the previous version has no cached matrices; the next load then preprocesses everything.
+        """
+        previous = MatrixCache(data_config, previous_hash)
+        if not data_config.matrix_cache_dir or not previous.on_disk():
+            return None
+        
+        matrices, preprocessor, X, y = previous.load(data_config)
+        # The appended rows in file order, as a fresh load_preprocessed_data would hold them
+        new_rows = pd.concat([train, test]).sort_index()
+        X = DataLoader.concat_rows([X, new_rows[data_config.X]])
+        y = pd.concat([y, new_rows[data_config.y]])
+        for split, name in ((train, "train"), (test, "test")):
+            if split.empty:
+                continue
+            X_name, y_name = "X_" + name, "y_" + name
+            X_new = preprocessor.transform(split[data_config.X], handle_unknown="ignore")
+            if sp.issparse(matrices[X_name]):
+                matrices[X_name] = sp.vstack([matrices[X_name], sp.csr_matrix(X_new)], format="csr")
+            else:
+                matrices[X_name] = np.vstack([matrices[X_name], X_new])
+            matrices[y_name] = np.concatenate([matrices[y_name], split[data_config.y].to_numpy()])
+        return matrices, preprocessor, X, y
+    
+    @staticmethod
+    def concat_rows(frames):
+        """ Concatenates frames row-wise, keeping categorical columns categorical over the union of their categories """
+        combined = pd.concat(frames)
+        for column in frames[0].columns:
+            if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+                categories = union_categoricals([frame[column] for frame in frames]).categories
+                combined[column] = combined[column].astype(pd.CategoricalDtype(categories))
+        return combined
+    
+    @staticmethod
+    def stored_hours(data_config):
+        """ (date, hour) of every row in the data file """
+        if data_config.cache_dir and ColumnarCache.available():
+            stored = ColumnarCache(data_config).load(columns=["date", "hour"])
+        else:
+            stored = pd.read_csv(data_config.path, usecols=["date", "hour"])
+            stored["date"] = pd.to_datetime(stored["date"], format=data_config.date_format)
+        return pd.MultiIndex.from_arrays([stored["date"].astype("datetime64[ns]"), stored["hour"]])
+    
+    @staticmethod
+    def drop_stored_hours(data_config, dataset):
+        """ Drop the rows whose date and hour are already in the data file, so ingesting a batch twice is a no-op """
+        dates = dataset["date"]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, format=data_config.date_format)
+        hours = pd.MultiIndex.from_arrays([dates.astype("datetime64[ns]"), dataset["hour"]])
+        stored = hours.isin(DataLoader.stored_hours(data_config))
+        if stored.any():
+            print(f"Skipping {int(stored.sum())} rows whose hours are already stored")
+        return dataset[~stored]
+    
+    @staticmethod
+    def ingest(data_config, dataset):
+        """ Append new hourly rows and extend the cached matrices, instead of reprocessing the whole history
+        
+        Hours already stored are skipped, and the cached matrices are extended before the rows are written, so
+        a failed or repeated ingest never stores rows twice. Returns the cleaned (train, test) frames of the new rows
+        """
+        previous_hash = DataLoader.data_hash(data_config)
+        previous_rows = DataLoader.row_count(data_config)
         
+        dataset = DataLoader.drop_stored_hours(data_config, dataset)
+        columns = list(pd.read_csv(data_config.path, nrows=0).columns)
+        typed = DataLoader.create_dat_month_col(data_config, dataset[columns].copy())
+        # Row positions in the whole data file, like the index of a full load
+        typed.index = pd.RangeIndex(previous_rows, previous_rows + len(typed))
+        cleaned = DataLoader.drop_rows_and_columns(data_config, typed)
+        train, test = DataLoader.split_new_rows(data_config, cleaned, previous_rows)
+        if typed.empty:
+            return train, test
         
-    
\ No newline at end of file
+        extended = DataLoader.extend_preprocessed_data(data_config, previous_hash, train, test)
+        DataLoader.append_data(data_config, dataset)
+        if extended is not None:
+            MatrixCache(data_config, DataLoader.data_hash(data_config)).save(*extended)
+        return train, test
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from bikeshare.dataloader.preprocessor import Preprocessor
+
+# Data config entries that only control where and how files are stored, not the matrices themselves
+STORAGE_KEYS = {"cache_dir", "chunksize", "shard_dir", "matrix_cache_dir"}
+MATRIX_NAMES = ("X_train", "X_test", "y_train", "y_test")
+
+# Matrices already loaded or computed in this process, by cache key
+_loaded = {}
+
+
+class MatrixCache:
+    """ Content-addressed store of the split and transformed matrices produced by DataLoader.preprocess_data
+
+    Entries are keyed by the sha256 of the raw data plus the data config, shared in memory within the
+    process and saved to matrix_cache_dir as .npz (scipy sparse format for sparse matrices), together with the
+    untransformed X and y as Parquet so a hit does not read the raw data again.
+    """
+
+    def __init__(self, data_config, data_hash):
+        self.cache_dir = data_config.matrix_cache_dir
+        settings = {name: value for name, value in vars(data_config).items() if name not in STORAGE_KEYS}
+        payload = json.dumps({"data": data_hash, "config": settings}, sort_keys=True, default=str)
+        self.key = hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def path(self, suffix):
+        return os.path.join(self.cache_dir, f"{self.key}{suffix}")
+
+    def get_loaded(self):
+        """ Entry computed or loaded earlier in this process, or None """
+        return _loaded.get(self.key)
+
+    def put_loaded(self, entry):
+        _loaded[self.key] = entry
+
+    def on_disk(self):
+        # Entries written before X and y were stored are rebuilt
+        return os.path.isfile(self.path(".preprocessor.npz")) and os.path.isfile(self.path(".data.parquet"))
+
+    def save(self, matrices, preprocessor, X, y):
+        """ Saves {name: matrix} for MATRIX_NAMES, the fitted preprocessor and the untransformed X and y """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        dense = {}
+        for name, matrix in matrices.items():
+            if sp.issparse(matrix):
+                sp.save_npz(self.path(f".{name}.npz"), matrix.tocsr(), compressed=False)
+            else:
+                dense[name] = np.asarray(matrix)
+        np.savez(self.path(".npz"), **dense)
+        pd.concat([X, y], axis=1).to_parquet(self.path(".data.parquet"))
+        # Written last, its presence marks a complete entry
+        preprocessor.save(self.path(".preprocessor.npz"))
+
+    def load(self, data_config):
+        """ Returns ({name: matrix}, preprocessor, X, y) from disk """
+        matrices = {}
+        with np.load(self.path(".npz"), allow_pickle=False) as dense:
+            for name in dense.files:
+                matrices[name] = dense[name]
+        for name in MATRIX_NAMES:
+            if name not in matrices:
+                matrices[name] = sp.load_npz(self.path(f".{name}.npz"))
+        data = pd.read_parquet(self.path(".data.parquet"))
+        return matrices, Preprocessor.load(self.path(".preprocessor.npz")), data[data_config.X], data[data_config.y]
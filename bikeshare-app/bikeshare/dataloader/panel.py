@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+
+class StationPanel:
+    """ Hourly rentals of every station on a complete station x hour grid, with the city-wide weather per hour
+
+    y is a (n_stations, n_hours) float32 array, NaN where a station did not report, so lags and rolling windows
+    are plain column offsets shared by all stations. exog holds one (n_hours,) array per weather column.
+    """
+
+    def __init__(self, stations, start, y, exog):
+        self.stations = np.asarray(stations).astype(str)
+        self.start = pd.Timestamp(start)
+        self.y = y
+        self.exog = exog
+
+    @property
+    def n_hours(self):
+        return self.y.shape[1]
+
+    @classmethod
+    def from_frame(cls, data, forecasting_config):
+        """ Builds the panel from one row per station and hour """
+        times = pd.to_datetime(data[forecasting_config.datetime]).dt.floor("h")
+        start = times.min()
+        hours = ((times - start) // pd.Timedelta(hours=1)).to_numpy()
+        n_hours = int(hours.max()) + 1
+        stations, station_index = np.unique(data[forecasting_config.station].astype(str).to_numpy(), return_inverse=True)
+
+        y = np.full((len(stations), n_hours), np.nan, dtype=np.float32)
+        y[station_index, hours] = data[forecasting_config.y].to_numpy(dtype=np.float32)
+
+        exog = {}
+        for column in forecasting_config.exog:
+            # The weather is city-wide, stations reporting the same hour are averaged
+            values = data[column].to_numpy(dtype=np.float64)
+            known = ~np.isnan(values)
+            sums = np.bincount(hours[known], weights=values[known], minlength=n_hours)
+            counts = np.bincount(hours[known], minlength=n_hours)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                exog[column] = np.where(counts > 0, sums / counts, np.nan)
+        return cls(stations, start, y, exog)
+
+    def times(self, hours):
+        """ Timestamps of hour indices """
+        return self.start + pd.to_timedelta(np.asarray(hours), unit="h")
+
+    def hour_index(self, timestamp):
+        """ Hour index of a timestamp, which may lie past the end of the panel """
+        return int((pd.Timestamp(timestamp).floor("h") - self.start) // pd.Timedelta(hours=1))
+
+    def exog_until(self, end, weather=None):
+        """ Weather arrays covering hours [0, end), filled past the panel from weather where given
+
+        weather is a DataFrame of the exog columns indexed by datetime, e.g. a weather forecast; hours it does
+        not cover stay NaN, which XGBoost treats as missing
+        """
+        if weather is not None:
+            future = weather.copy()
+            future.index = [self.hour_index(timestamp) for timestamp in future.index]
+        exog = {}
+        for column, values in self.exog.items():
+            extended = np.full(max(end, self.n_hours), np.nan)
+            extended[:self.n_hours] = values
+            if weather is not None and column in future:
+                in_range = (future.index >= 0) & (future.index < len(extended))
+                extended[future.index[in_range]] = future[column].to_numpy(dtype=np.float64)[in_range]
+            exog[column] = extended
+        return exog
+
+
+class PanelFeatures:
+    """ Direct multi-horizon features of a StationPanel, for one model shared by every station and horizon
+
+    Each (station, origin, horizon) row describes the forecast made at origin, the last observed hour, for the
+    hour origin + horizon: the station and horizon, the calendar and weather of the target hour, the station's
+    rentals lags hours before the origin, its mean rentals over the windows ending at the origin, and its
+    rentals at the same hour of the day/week (periods) in the most recent observed cycle. Every feature is a
+    column offset on the panel arrays, so a whole group of stations is built with a few NumPy gathers.
+    """
+
+    CALENDAR = ["hour", "day_of_week", "month"]
+
+    def __init__(self, stations, lags, windows, periods, exog_columns, horizon):
+        self.stations = np.asarray(stations).astype(str)
+        self.lags = [int(lag) for lag in lags]
+        self.windows = [int(window) for window in windows]
+        self.periods = [int(period) for period in periods]
+        self.exog_columns = [str(column) for column in exog_columns]
+        self.horizon = int(horizon)
+        self._station_codes = {station: code for code, station in enumerate(self.stations.tolist())}
+
+    @property
+    def feature_names(self):
+        return (
+            ["station", "horizon"] + self.CALENDAR + list(self.exog_columns)
+            + [f"lag_{lag}" for lag in self.lags]
+            + [f"rolling_mean_{window}" for window in self.windows]
+            + [f"same_hour_{period}h" for period in self.periods]
+        )
+
+    @property
+    def lookback(self):
+        """ Hours of history before an origin the lags and windows read """
+        return max(self.lags + self.windows + [1])
+
+    def station_codes(self, stations):
+        """ Station feature values, NaN for stations the model was not trained on """
+        return np.array([self._station_codes.get(station, np.nan) for station in stations], dtype=np.float32)
+
+    @staticmethod
+    def station_groups(n_stations, rows_per_station, max_group_rows):
+        """ Slices of consecutive stations whose feature rows together stay within max_group_rows """
+        size = max(1, max_group_rows // max(1, rows_per_station))
+        for start in range(0, n_stations, size):
+            yield slice(start, min(start + size, n_stations))
+
+    def build(self, panel, stations, origins, horizons, exog=None, end=None):
+        """ Returns the float32 feature matrix and the targets of every (station, origin, horizon), in that order
+
+        stations is a slice of the panel stations, exog the weather arrays from StationPanel.exog_until when the
+        targets run past the panel. Targets at or after hour end, outside the panel or not reported are NaN.
+        """
+        origins = np.asarray(origins, dtype=np.int64)
+        horizons = np.asarray(horizons, dtype=np.int64)
+        exog = panel.exog if exog is None else exog
+        end = panel.n_hours if end is None else min(end, panel.n_hours)
+        y = panel.y[stations]
+        n_stations, n_origins, n_horizons = len(y), len(origins), len(horizons)
+        # (origin, horizon) hour index of every target
+        targets = origins[:, None] + horizons[None, :]
+
+        # NaN padding on both sides turns reads before the first or after the last hour into missing values
+        pad_left = self.lookback + max(self.periods + [0])
+        pad_right = max(0, int(targets.max()) + 1 - panel.n_hours)
+        padded = np.full((n_stations, pad_left + panel.n_hours + pad_right), np.nan, dtype=np.float32)
+        padded[:, pad_left:pad_left + end] = y[:, :end]
+        history = np.full_like(padded, np.nan)
+        history[:, pad_left:pad_left + panel.n_hours] = y
+
+        names = self.feature_names
+        X = np.empty((n_stations * n_origins * n_horizons, len(names)), dtype=np.float32)
+        # View with one axis per row dimension, so each feature is written by broadcasting
+        columns = X.reshape(n_stations, n_origins, n_horizons, len(names))
+        position = iter(range(len(names)))
+
+        columns[..., next(position)] = self.station_codes(panel.stations[stations])[:, None, None]
+        columns[..., next(position)] = horizons
+        target_times = panel.times(targets.ravel())
+        for values in (target_times.hour, target_times.dayofweek, target_times.month):
+            columns[..., next(position)] = np.asarray(values).reshape(n_origins, n_horizons)
+        for column in self.exog_columns:
+            values = exog[column]
+            in_range = targets < len(values)
+            columns[..., next(position)] = np.where(in_range, values[np.minimum(targets, len(values) - 1)], np.nan)
+
+        for lag in self.lags:
+            # lag 1 is the origin hour itself
+            columns[..., next(position)] = history[:, origins + pad_left - lag + 1][:, :, None]
+        if self.windows:
+            observed = ~np.isnan(history)
+            sums = np.zeros((n_stations, history.shape[1] + 1))
+            np.cumsum(np.where(observed, history, 0), axis=1, out=sums[:, 1:])
+            counts = np.zeros((n_stations, history.shape[1] + 1))
+            np.cumsum(observed, axis=1, out=counts[:, 1:])
+            stop = origins + pad_left + 1
+            for window in self.windows:
+                # Mean of the reported hours in (origin - window, origin]
+                window_counts = counts[:, stop] - counts[:, stop - window]
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    means = (sums[:, stop] - sums[:, stop - window]) / window_counts
+                columns[..., next(position)] = np.where(window_counts > 0, means, np.nan)[:, :, None]
+        for period in self.periods:
+            # Latest observed hour congruent to the target modulo period, i.e. at or before the origin
+            source = targets - period * -(-horizons // period)
+            columns[..., next(position)] = history[:, source + pad_left]
+
+        return X, padded[:, targets + pad_left].reshape(-1)
+
+    def save(self, path):
+        """ Saves the feature definition as an uncompressed .npz (no pickled objects) """
+        with open(path, "wb") as outputfile:
+            np.savez(
+                outputfile,
+                stations=self.stations,
+                lags=np.asarray(self.lags, dtype=np.int64),
+                windows=np.asarray(self.windows, dtype=np.int64),
+                periods=np.asarray(self.periods, dtype=np.int64),
+                exog_columns=np.asarray(self.exog_columns, dtype=str),
+                horizon=np.asarray(self.horizon)
+            )
+
+    @classmethod
+    def load(cls, path):
+        """ Loads a feature definition saved with save, refusing pickled content """
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(
+                arrays["stations"], arrays["lags"], arrays["windows"], arrays["periods"],
+                arrays["exog_columns"], int(arrays["horizon"])
+            )
@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class Preprocessor:
+    """ Array-backed equivalent of the fitted MinMaxScaler + OneHotEncoder ColumnTransformer """
+
+    def __init__(self, num_columns, scale, offset, cat_columns, categories):
+        self.num_columns = [str(column) for column in num_columns]
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.cat_columns = [str(column) for column in cat_columns]
+        self.categories = [np.asarray(values, dtype=str) for values in categories]
+
+        # Sorted view of every vocabulary, so a whole column is encoded with one searchsorted
+        self._order = [np.argsort(values, kind="stable") for values in self.categories]
+        self._sorted = [values[order] for values, order in zip(self.categories, self._order)]
+
+        self._starts = []
+        start = len(self.num_columns)
+        for values in self.categories:
+            self._starts.append(start)
+            start += len(values)
+        self.n_features = start
+
+        # Compiled single-record path: plain Python scale/offset lists, category -> output column maps
+        # and a preallocated output row
+        self._record_scale = self.scale.tolist()
+        self._record_offset = self.offset.tolist()
+        self._record_index = [
+            {value: column_start + position for position, value in enumerate(values.tolist())}
+            for column_start, values in zip(self._starts, self.categories)
+        ]
+        self._record_buffer = np.zeros((1, self.n_features), dtype=np.float32)
+
+    @classmethod
+    def from_col_transformer(cls, col_transformer):
+        """ Builds the preprocessor from the ColumnTransformer fitted in DataLoader.preprocess_data """
+        fitted = {name: (transformer, columns) for name, transformer, columns in col_transformer.transformers_}
+        scaler, num_columns = fitted["num"]
+        encoder, cat_columns = fitted["cat"]
+        return cls(list(num_columns), scaler.scale_, scaler.min_, list(cat_columns), encoder.categories_)
+
+    @property
+    def feature_names(self):
+        """ Column names after transformation, in output order """
+        names = list(self.num_columns)
+        for column, values in zip(self.cat_columns, self.categories):
+            names.extend(f"{column}_{value}" for value in values)
+        return names
+
+    def _category_positions(self, index, values, handle_unknown="error"):
+        """ Returns the vocabulary position of every value and the mask of known values
+        
+        Unseen categories raise like OneHotEncoder, or with handle_unknown="ignore" are left out of the mask
+        """
+        sorted_values = self._sorted[index]
+        values = np.asarray(values).astype(str)
+        positions = np.searchsorted(sorted_values, values).clip(max=len(sorted_values) - 1)
+        unknown = sorted_values[positions] != values
+        if unknown.any() and handle_unknown != "ignore":
+            raise ValueError(
+                f"Found unknown categories {sorted(set(values[unknown].tolist()))} in column "
+                f"{self.cat_columns[index]} during transform"
+            )
+        return self._order[index][positions], ~unknown
+
+    def transform(self, data, handle_unknown="error"):
+        """ Transforms a DataFrame into the float32 feature matrix the model was trained on
+        
+        With handle_unknown="ignore" unseen categories are encoded as all zeros, as OneHotEncoder does
+        """
+        n_rows = len(data)
+        transformed = np.zeros((n_rows, self.n_features), dtype=np.float32)
+
+        n_num = len(self.num_columns)
+        if n_num:
+            transformed[:, :n_num] = data[self.num_columns].to_numpy(dtype=np.float64) * self.scale + self.offset
+
+        rows = np.arange(n_rows)
+        for index, column in enumerate(self.cat_columns):
+            positions, known = self._category_positions(index, data[column].to_numpy(), handle_unknown)
+            transformed[rows[known], self._starts[index] + positions[known]] = 1.0
+
+        return transformed
+
+    def transform_record(self, record, out=None):
+        """ Transforms one record (dict) without pandas, writing into a preallocated float32 row
+        
+        The returned (1, n_features) array is reused by the next call unless out is given
+        """
+        if out is None:
+            out = self._record_buffer
+        row = out[0]
+        row[:] = 0.0
+        row[:len(self.num_columns)] = [
+            record[column] * scale + offset
+            for column, scale, offset in zip(self.num_columns, self._record_scale, self._record_offset)
+        ]
+        for column, index in zip(self.cat_columns, self._record_index):
+            value = record[column]
+            if value not in index:
+                raise ValueError(f"Found unknown categories [{value!r}] in column {column} during transform")
+            row[index[value]] = 1.0
+        return out
+
+    def save(self, path):
+        """ Saves the scaler vectors and category vocabularies as an uncompressed .npz (no pickled objects) """
+        arrays = {
+            "num_columns": np.asarray(self.num_columns, dtype=str),
+            "scale": self.scale,
+            "offset": self.offset,
+            "cat_columns": np.asarray(self.cat_columns, dtype=str),
+        }
+        for index, values in enumerate(self.categories):
+            arrays[f"categories_{index}"] = values
+        with open(path, "wb") as outputfile:
+            np.savez(outputfile, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """ Loads a preprocessor saved with save, refusing pickled content """
+        with np.load(path, allow_pickle=False) as arrays:
+            cat_columns = arrays["cat_columns"]
+            return cls(
+                arrays["num_columns"],
+                arrays["scale"],
+                arrays["offset"],
+                cat_columns,
+                [arrays[f"categories_{index}"] for index in range(len(cat_columns))]
+            )
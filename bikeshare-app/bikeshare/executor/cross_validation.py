@@ -0,0 +1,131 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import xgboost as xg
+
+from bikeshare.utils.metrics import MetricsStore
+from bikeshare.utils.postprocessing import ModelSaving
+
+# Views of the shared feature matrix and target, set once per worker process by _init_worker
+_worker_data = {}
+
+
+def _init_worker(shm_name, X_shape, y_shape, n_jobs):
+    """ Attaches to the shared block instead of receiving a pickled copy of the matrix """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    X = np.ndarray(X_shape, dtype=np.float32, buffer=shm.buf)
+    y = np.ndarray(y_shape, dtype=np.float32, buffer=shm.buf, offset=X.nbytes)
+    # The SharedMemory object is kept so the views stay valid for the life of the worker
+    _worker_data.update(shm=shm, X=X, y=y, n_jobs=n_jobs)
+
+
+def _fit_fold(fold, params, n_estimators, random_state):
+    """ Fits rows [train_start, train_stop) and scores rows [test_start, test_stop) of the shared data """
+    X, y = _worker_data["X"], _worker_data["y"]
+    model = xg.XGBRegressor(
+        objective='reg:squarederror',
+        n_estimators=n_estimators,
+        random_state=random_state,
+        n_jobs=_worker_data["n_jobs"],
+        **params
+    )
+    # Contiguous row ranges, so the slices are views of the shared block
+    model.fit(X[fold["train_start"]:fold["train_stop"]], y[fold["train_start"]:fold["train_stop"]])
+    y_test = y[fold["test_start"]:fold["test_stop"]]
+    y_test_pred = model.predict(X[fold["test_start"]:fold["test_stop"]])
+    return {**fold, "metrics": ModelSaving.get_model_metrics(y_test, y_test_pred)}
+
+
+def time_series_folds(hours, n_folds, test_hours, gap_hours=0, max_train_hours=None):
+    """ Rolling-origin folds over rows sorted by time, as row ranges
+
+    The last n_folds blocks of test_hours are the test sets, each trained on every row before it (or only the
+    last max_train_hours) and separated from it by gap_hours, so no fold trains on hours after its test hours.
+    hours is the hour of every row, counted from any fixed start.
+    """
+    hours = np.asarray(hours)
+    end = hours[-1] + 1
+    folds = []
+    for fold in range(n_folds):
+        test_begin = end - (n_folds - fold) * test_hours
+        train_end = test_begin - gap_hours
+        train_begin = hours[0] if max_train_hours is None else train_end - max_train_hours
+        bounds = np.searchsorted(hours, [train_begin, train_end, test_begin, test_begin + test_hours])
+        train_start, train_stop, test_start, test_stop = (int(bound) for bound in bounds)
+        if train_stop <= train_start or test_stop <= test_start:
+            raise ValueError(f"Fold {fold} has no training or test rows, use fewer folds or shorter test_hours")
+        folds.append({
+            "fold": fold, "train_start": train_start, "train_stop": train_stop,
+            "test_start": test_start, "test_stop": test_stop
+        })
+    return folds
+
+
+class CrossValidation():
+    """ Time-series cross-validation, fitting the folds in parallel worker processes
+
+    The preprocessed matrix is copied once into a shared memory block that every worker maps, so memory
+    does not grow with the number of workers and nothing large is pickled per fold.
+    """
+
+    def __init__(self, cv_config, params, n_estimators, random_state):
+        self.config = cv_config
+        self.params = params
+        self.n_estimators = n_estimators
+        self.random_state = random_state
+        self.n_workers = min(cv_config.n_workers or os.cpu_count(), cv_config.n_folds)
+
+    def run(self, X, y, hours):
+        """ Fits every fold on the time-ordered (X, y), returning the folds with their test metrics """
+        folds = time_series_folds(
+            hours, self.config.n_folds, self.config.test_hours, self.config.gap_hours, self.config.max_train_hours
+        )
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        y = np.ascontiguousarray(y, dtype=np.float32)
+        n_jobs = max(1, os.cpu_count() // self.n_workers)
+
+        shm = shared_memory.SharedMemory(create=True, size=X.nbytes + y.nbytes)
+        try:
+            np.ndarray(X.shape, dtype=np.float32, buffer=shm.buf)[:] = X
+            np.ndarray(y.shape, dtype=np.float32, buffer=shm.buf, offset=X.nbytes)[:] = y
+            with ProcessPoolExecutor(
+                max_workers=self.n_workers, initializer=_init_worker, initargs=(shm.name, X.shape, y.shape, n_jobs)
+            ) as executor:
+                futures = [
+                    executor.submit(_fit_fold, fold, self.params, self.n_estimators, self.random_state)
+                    for fold in folds
+                ]
+                results = [future.result() for future in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+
+        for result in results:
+            print(f"Fold {result['fold']}: {result['train_stop'] - result['train_start']} training rows, "
+                  f"{result['test_stop'] - result['test_start']} test rows, RMSE {result['metrics']['RMSE']:.2f}")
+        return results
+
+    @staticmethod
+    def summarize(results):
+        """ Mean and standard deviation of every metric across folds """
+        names = list(results[0]["metrics"])
+        values = np.array([[result["metrics"][name] for name in names] for result in results])
+        return dict(zip(names, values.mean(axis=0).tolist())), dict(zip(names, values.std(axis=0).tolist()))
+
+    @staticmethod
+    def save_results(results, model_name, output_config, timestamp=None):
+        """ Appends every fold and the mean/std across folds to the model's metrics store """
+        timestamp = timestamp or ModelSaving.get_current_timestamp()
+        store = MetricsStore(model_name, output_config)
+        for result in results:
+            store.append(
+                result["metrics"], timestamp, cv_fold=result["fold"],
+                train_rows=result["train_stop"] - result["train_start"],
+                test_rows=result["test_stop"] - result["test_start"]
+            )
+        mean, std = CrossValidation.summarize(results)
+        store.append(mean, timestamp, cv_fold="mean")
+        store.append(std, timestamp, cv_fold="std")
+        return print("Saved cross-validation metrics to: ", store.filepath)
@@ -0,0 +1,61 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import xgboost as xg
+
+# Column holding the expected value in the output of ModelExplainer.contributions
+BIAS_NAME = "bias"
+
+
+class ModelExplainer:
+    """ Feature importances and TreeSHAP contributions of one loaded model version
+
+    Contributions come from XGBoost's native pred_contribs for a whole matrix at once. They are cached by
+    the content of the transformed matrix, so explaining the same rows again with this model is free.
+    """
+
+    def __init__(self, loaded, max_cached=8):
+        self.key = loaded.key
+        self.feature_names = loaded.preprocessor.feature_names
+        self.booster = loaded.model.get_booster()
+        self.max_cached = max_cached
+        self._contributions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def feature_importance(self, importance_type="gain"):
+        """ {feature name: importance} normalized to sum to 1, most important first """
+        score = self.booster.get_score(importance_type=importance_type)
+        values = np.array([score.get(f"f{index}", score.get(name, 0.0)) for index, name in enumerate(self.feature_names)])
+        total = values.sum()
+        if total > 0:
+            values = values / total
+        order = np.argsort(-values, kind="stable")
+        return {self.feature_names[index]: float(values[index]) for index in order}
+
+    def contributions(self, transformed_data, approximate=False):
+        """ (n_rows, n_features + 1) TreeSHAP values of a transformed matrix, the last column is the bias
+
+        Each row sums to the model's raw prediction for that row. approximate uses XGBoost's approx_contribs,
+        which attributes along each row's decision path only and is much faster than exact TreeSHAP.
+        """
+        transformed_data = np.ascontiguousarray(transformed_data, dtype=np.float32)
+        digest = hashlib.blake2b(transformed_data.tobytes(), digest_size=16)
+        digest.update(str((transformed_data.shape, approximate)).encode())
+        key = digest.hexdigest()
+        with self._lock:
+            if key in self._contributions:
+                self._contributions.move_to_end(key)
+                return self._contributions[key]
+
+        contributions = self.booster.predict(
+            xg.DMatrix(transformed_data), pred_contribs=True, approx_contribs=approximate
+        )
+        # Shared with every later caller of the same rows
+        contributions.setflags(write=False)
+        with self._lock:
+            self._contributions[key] = contributions
+            while len(self._contributions) > self.max_cached:
+                self._contributions.popitem(last=False)
+        return contributions
@@ -1,10 +1,20 @@
 from bikeshare.utils.config import Config
 from bikeshare.configs.config import CFGLog
-import os 
-import pickle
+from bikeshare.executor.registry import ModelRegistry
+from bikeshare.executor.explainer import BIAS_NAME, ModelExplainer
+from collections import OrderedDict
+import threading
+import numpy as np
+import pandas as pd
+
+# Number of rows transformed and scored together by infer_batch
+DEFAULT_BATCH_SIZE = 8192
+
+# Name under which BikeshareXGBoost exports its models
+XGB_MODEL_NAME = "XGBoost"
 
 class Inferrer:
-    def __init__(self):
+    def __init__(self, registry=None):
         self.config = Config.from_json(CFGLog)
         # self.dt_saved_path = os.path.join(self.config.output.output_path, self.config.output.dt_path, self.config.output.dt_model)
         # with open(self.dt_saved_path, "rb") as f:
@@ -14,9 +24,42 @@ class Inferrer:
         # with open(self.rf_saved_path, "rb") as f:
         #     self.rf_col_transformer, self.rf_model = pickle.load(f)
         
-        self.xgb_saved_path = os.path.join(self.config.output.output_path, self.config.output.xgb_model)
-        with open(self.xgb_saved_path, "rb") as f:
-            self.xgb_col_transformer, self.xgb_model = pickle.load(f)
+        if registry is None:
+            registry = ModelRegistry(
+                self.config.output.output_path,
+                max_resident=self.config.output.max_resident_models,
+                poll_interval=self.config.output.poll_interval,
+                runtime=self.config.output.runtime
+            )
+        self.registry = registry
+        # "xgboost" or "onnx", see OnnxModel
+        self.runtime = registry.runtime
+        
+        # "latest" follows the newest saved XGBoost model, anything else pins that saved model
+        self.xgb_pinned_model = None if self.config.output.xgb_model == "latest" else self.config.output.xgb_model
+        self.xgb_current()
+        
+        # One explainer per model version, so cached explanations never outlive the model they describe
+        self._explainers = OrderedDict()
+        self._explainers_lock = threading.Lock()
+    
+    def xgb_current(self):
+        """ Returns the LoadedModel to serve; take it once per request so a hot swap never mixes two models """
+        if self.xgb_pinned_model is not None:
+            return self.registry.get(self.xgb_pinned_model)
+        return self.registry.current(XGB_MODEL_NAME)
+    
+    @property
+    def xgb_saved_path(self):
+        return self.xgb_current().path
+    
+    @property
+    def xgb_preprocessor(self):
+        return self.xgb_current().preprocessor
+    
+    @property
+    def xgb_model(self):
+        return self.xgb_current().model
     
     # def dt_preprocess(self, new_data):
     #     return self.dt_col_transformer.transform(new_data)
@@ -25,7 +68,19 @@ class Inferrer:
     #     return self.rf_col_transformer.transform(new_data)
     
     def xgb_preprocess(self, new_data):
-        return self.xgb_col_transformer.transform(new_data)
+        return self.xgb_preprocessor.transform(new_data)
+    
+    def to_frame(self, records):
+        """ Converts a list of records, a NumPy array or an Arrow table to a DataFrame with the training columns """
+        if isinstance(records, pd.DataFrame):
+            return records
+        if hasattr(records, "to_pandas"):
+            # pyarrow.Table / pyarrow.RecordBatch
+            return records.to_pandas()
+        if isinstance(records, np.ndarray):
+            # Rows are expected in the order of the configured feature columns
+            return pd.DataFrame(records, columns=self.config.data.X).infer_objects()
+        return pd.DataFrame.from_records(list(records), columns=self.config.data.X)
     
     # def get_col_names_after_transform(self):
     #     """ Get column names after transformation """
@@ -63,15 +118,84 @@ class Inferrer:
     
     
     ############# XGBoost #############
+    def predict_frame(self, loaded, data):
+        """ Scores a DataFrame with the loaded model in the configured runtime """
+        if self.runtime == "onnx":
+            # The ONNX graph includes the preprocessing
+            return loaded.model.predict_frame(data)
+        return loaded.model.predict(loaded.preprocessor.transform(data))
+    
     def xgb_infer(self, new_data):
         """ Infer data using xgboost model """
-        transformed_data = self.xgb_preprocess(new_data)
-        xgb_prediction = self.xgb_model.predict(transformed_data)
-        print(f'Model in use: {self.xgb_saved_path}')
+        loaded = self.xgb_current()
+        xgb_prediction = self.predict_frame(loaded, new_data)
+        print(f'Model in use: {loaded.path}')
         return xgb_prediction
     
+    def infer_record(self, record):
+        """ Infer a single record (dict) using xgboost model through the compiled preprocessing path """
+        loaded = self.xgb_current()
+        if self.runtime == "onnx":
+            return loaded.model.predict_record(record)
+        # A fresh output row per call keeps concurrent sessions from sharing the preprocessor's buffer
+        row = np.empty((1, loaded.preprocessor.n_features), dtype=np.float32)
+        transformed_data = loaded.preprocessor.transform_record(record, out=row)
+        return float(loaded.model.predict(transformed_data)[0])
+    
+    def infer_batch(self, records, batch_size=DEFAULT_BATCH_SIZE):
+        """ Infer many rows at once using xgboost model, in micro-batches of batch_size rows """
+        loaded = self.xgb_current()
+        data = self.to_frame(records)
+        predictions = np.empty(len(data), dtype=np.float32)
+        for start in range(0, len(data), batch_size):
+            batch = data.iloc[start:start + batch_size]
+            predictions[start:start + len(batch)] = self.predict_frame(loaded, batch)
+        return predictions
+    
+    def require_booster(self):
+        if self.runtime != "xgboost":
+            raise ValueError(f"Feature importance and explanations need the xgboost runtime, not {self.runtime}")
+    
     def xgb_feature_importance(self):
         """ Return feature importance for xgboost model """
+        self.require_booster()
         return self.xgb_model.feature_importances_
     
+    def xgb_explainer(self, loaded=None):
+        """ Returns the ModelExplainer of the served (or given) model version """
+        self.require_booster()
+        loaded = loaded or self.xgb_current()
+        with self._explainers_lock:
+            explainer = self._explainers.get(loaded.key)
+            if explainer is None:
+                explainer = self._explainers[loaded.key] = ModelExplainer(loaded)
+            self._explainers.move_to_end(loaded.key)
+            while len(self._explainers) > self.config.output.max_resident_models:
+                self._explainers.popitem(last=False)
+        return explainer
+    
+    def xgb_feature_names(self):
+        """ Column names after transformation, in the order the model sees them """
+        return self.xgb_preprocessor.feature_names
+    
+    def xgb_named_feature_importance(self, importance_type="gain"):
+        """ Return {column name: importance} for xgboost model, most important first """
+        return self.xgb_explainer().feature_importance(importance_type)
+    
+    def xgb_contributions(self, records, batch_size=DEFAULT_BATCH_SIZE, approximate=False):
+        """ Per-row TreeSHAP contributions of every transformed column plus the bias, as a DataFrame
+        
+        The rows are transformed and explained in batches of batch_size rows, each in one pred_contribs call;
+        see ModelExplainer.contributions for approximate
+        """
+        loaded = self.xgb_current()
+        explainer = self.xgb_explainer(loaded)
+        data = self.to_frame(records)
+        contributions = np.empty((len(data), len(explainer.feature_names) + 1), dtype=np.float32)
+        for start in range(0, len(data), batch_size):
+            batch = data.iloc[start:start + batch_size]
+            transformed_data = loaded.preprocessor.transform(batch)
+            contributions[start:start + len(batch)] = explainer.contributions(transformed_data, approximate)
+        return pd.DataFrame(contributions, index=data.index, columns=explainer.feature_names + [BIAS_NAME])
+    
     
\ No newline at end of file
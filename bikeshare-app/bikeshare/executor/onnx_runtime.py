@@ -0,0 +1,45 @@
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+from bikeshare.utils.onnx_export import CAT_INPUT, NUM_INPUT
+
+
+class OnnxModel:
+    """ Serves a graph exported by OnnxExport with onnxruntime; no XGBoost booster is kept in memory
+
+    The graph does the preprocessing itself, so it is fed the raw feature values of a DataFrame or record.
+    """
+
+    def __init__(self, onnx_model, preprocessor, intra_op_threads=None):
+        """ onnx_model is a path or the serialized graph """
+        if ort is None:
+            raise ImportError("onnxruntime is required for the ONNX runtime")
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(onnx_model, options, providers=["CPUExecutionProvider"])
+        self.num_columns = preprocessor.num_columns
+        self.cat_columns = preprocessor.cat_columns
+
+    def predict_frame(self, data):
+        """ Predictions for every row of a DataFrame with the training columns """
+        feeds = {}
+        if self.num_columns:
+            feeds[NUM_INPUT] = data[self.num_columns].to_numpy(dtype=np.float64)
+        if self.cat_columns:
+            # Column by column, DataFrame.astype(str) on categoricals costs more than scoring small batches
+            feeds[CAT_INPUT] = np.column_stack([data[column].to_numpy(dtype=object) for column in self.cat_columns])
+        return self.session.run(None, feeds)[0].ravel()
+
+    def predict_record(self, record):
+        """ Prediction for one record (dict), built without pandas """
+        feeds = {}
+        if self.num_columns:
+            feeds[NUM_INPUT] = np.array([[record[column] for column in self.num_columns]], dtype=np.float64)
+        if self.cat_columns:
+            feeds[CAT_INPUT] = np.array([[str(record[column]) for column in self.cat_columns]], dtype=object)
+        return float(self.session.run(None, feeds)[0][0, 0])
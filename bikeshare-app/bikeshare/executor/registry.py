@@ -0,0 +1,156 @@
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from bikeshare.dataloader.preprocessor import Preprocessor
+from bikeshare.executor.onnx_runtime import OnnxModel
+from bikeshare.utils.artifact import ONNX_FILE, ModelArtifact
+
+# <model_name>_<timestamp> artifact directories and <model_name>_<timestamp>.pkl files
+# written by ModelSaving.save_model_with_timestamp
+MODEL_FILE_PATTERN = re.compile(r"^(?P<name>.+)_(?P<timestamp>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})(\.pkl)?$")
+
+
+class LoadedModel:
+    """ A loaded (preprocessor, model) pair together with the file it was loaded from """
+
+    def __init__(self, key, path, preprocessor, model):
+        self.key = key
+        self.path = path
+        self.preprocessor = preprocessor
+        self.model = model
+
+
+def load_model(path, runtime="xgboost"):
+    """ Loads (preprocessor, model) from an artifact directory or a legacy pickled (col_transformer, model) file
+    
+    With runtime="onnx" the model is an OnnxModel of the artifact's ONNX graph and the booster is not loaded
+    """
+    if runtime == "onnx":
+        if not ModelArtifact.is_artifact(path):
+            raise ValueError(f"The ONNX runtime needs a model artifact with an ONNX graph, got {path}")
+        preprocessor, onnx_path = ModelArtifact.load_onnx(path)
+        return preprocessor, OnnxModel(onnx_path, preprocessor)
+    if ModelArtifact.is_artifact(path):
+        return ModelArtifact.load(path)
+    with open(path, "rb") as f:
+        col_transformer, model = pickle.load(f)
+    return Preprocessor.from_col_transformer(col_transformer), model
+
+
+class ModelRegistry:
+    """ Discovers the models saved to output_path, loads them lazily and tracks the newest one per model name
+
+    At most max_resident models are kept in memory (least recently used are dropped). The models current()
+    serves are never dropped, so with more model names in use than max_resident the bound is exceeded by
+    those. The output directory is rescanned at most every poll_interval seconds; when a newer model appears
+    it is loaded and swapped in as a single reference assignment, so in-flight requests finish on the model
+    they started with.
+    """
+
+    def __init__(self, output_path, max_resident=2, poll_interval=5.0, runtime="xgboost"):
+        self.output_path = output_path
+        self.max_resident = max_resident
+        self.poll_interval = poll_interval
+        self.runtime = runtime
+        self._resident = OrderedDict()
+        self._current = {}
+        self._paths = {}
+        self._last_scan = float("-inf")
+        self._cache_lock = threading.Lock()
+        # One lock per key, so concurrent misses on the same model load it once
+        self._load_locks = {}
+        self._refresh_lock = threading.Lock()
+
+    def discover(self):
+        """ Returns {key: (model_name, timestamp, path)} for every saved model in output_path """
+        models = {}
+        for entry in os.scandir(self.output_path):
+            match = MODEL_FILE_PATTERN.match(entry.name)
+            if match is None:
+                continue
+            if entry.is_dir() and not ModelArtifact.is_artifact(entry.path):
+                continue
+            # Models saved without a graph cannot be served by the ONNX runtime
+            if self.runtime == "onnx" and not os.path.isfile(os.path.join(entry.path, ONNX_FILE)):
+                continue
+            models[entry.name] = (match.group("name"), match.group("timestamp"), entry.path)
+        return models
+
+    def available(self, model_name=None):
+        """ Keys of the discovered models, oldest first """
+        models = [(timestamp, key) for key, (name, timestamp, _) in self._paths.items()
+                  if model_name is None or name == model_name]
+        return [key for _, key in sorted(models)]
+
+    def get(self, key):
+        """ Returns the model saved under key, loading it on first use """
+        with self._cache_lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                return self._resident[key]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._cache_lock:
+                # Loaded by another thread while this one waited for the lock
+                if key in self._resident:
+                    self._resident.move_to_end(key)
+                    return self._resident[key]
+
+            if key not in self._paths:
+                self._paths = self.discover()
+            if key not in self._paths:
+                raise FileNotFoundError(f"No saved model {key} in {self.output_path}")
+            path = self._paths[key][2]
+            preprocessor, model = load_model(path, self.runtime)
+            loaded = LoadedModel(key, path, preprocessor, model)
+
+            with self._cache_lock:
+                self._resident[key] = loaded
+                self._resident.move_to_end(key)
+                self._evict(keep=key)
+        return loaded
+
+    def _evict(self, keep):
+        """ Drops least recently used models beyond max_resident, other than keep and the current models """
+        in_use = {loaded.key for loaded in list(self._current.values())} | {keep}
+        for key in [key for key in self._resident if key not in in_use]:
+            if len(self._resident) <= self.max_resident:
+                break
+            del self._resident[key]
+
+    def refresh(self, model_name=None, blocking=True):
+        """ Rescans output_path and swaps model_name and every model name in use to its newest saved model """
+        if not self._refresh_lock.acquire(blocking=blocking):
+            # Another request is already refreshing, keep serving the current models
+            return
+        try:
+            self._last_scan = time.monotonic()
+            self._paths = self.discover()
+            model_names = set(self._current) if model_name is None else set(self._current) | {model_name}
+            for name in model_names:
+                available = self.available(name)
+                if not available:
+                    continue
+                current = self._current.get(name)
+                if current is None or current.key != available[-1]:
+                    self._current[name] = self.get(available[-1])
+                    # The replaced model is no longer protected from eviction
+                    with self._cache_lock:
+                        self._evict(keep=available[-1])
+        finally:
+            self._refresh_lock.release()
+
+    def current(self, model_name):
+        """ Returns the newest model saved under model_name, checking for new files every poll_interval seconds """
+        if model_name not in self._current:
+            self.refresh(model_name)
+            if model_name not in self._current:
+                raise FileNotFoundError(f"No saved {model_name} model in {self.output_path}")
+        elif time.monotonic() - self._last_scan >= self.poll_interval:
+            self.refresh(blocking=False)
+        return self._current[model_name]
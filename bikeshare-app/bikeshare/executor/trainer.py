@@ -1,4 +1,10 @@
 # This file contains the ModelTrainer class which is responsible for training the model.
+import numpy as np
+import xgboost as xg
+
+from bikeshare.utils.profiling import stage
+
+
 class ModelTrainer():
     def __init__(self, model, X_train, y_train):
         self.model = model
@@ -6,4 +12,48 @@ class ModelTrainer():
         self.y_train = y_train
         
     def train(self):
-        self.model.fit(self.X_train, self.y_train)
+        with stage("fit", rows=self.X_train.shape[0]):
+            self.model.fit(self.X_train, self.y_train)
+
+
+class ShardIterator(xg.DataIter):
+    """ Feeds (X, y) shards saved by DataLoader.preprocess_data_streaming to XGBoost one at a time """
+    
+    def __init__(self, shard_paths, cache_prefix):
+        self.shard_paths = shard_paths
+        self._index = 0
+        super().__init__(cache_prefix=cache_prefix)
+        
+    def next(self, input_data):
+        if self._index == len(self.shard_paths):
+            return False
+        with np.load(self.shard_paths[self._index]) as shard:
+            input_data(data=shard["X"], label=shard["y"])
+        self._index += 1
+        return True
+    
+    def reset(self):
+        self._index = 0
+
+
+class ExternalMemoryTrainer():
+    """ Trains an XGBoost booster from on-disk shards; peak memory is set by the shard size """
+    
+    def __init__(self, params, num_boost_round, shard_paths, cache_prefix):
+        self.params = params
+        self.num_boost_round = num_boost_round
+        self.shard_paths = shard_paths
+        self.cache_prefix = cache_prefix
+        
+    def train(self):
+        iterator = ShardIterator(self.shard_paths, self.cache_prefix)
+        with stage("build_dmatrix") as record:
+            dtrain = xg.ExtMemQuantileDMatrix(iterator)
+            record["rows"] = dtrain.num_row()
+        with stage("fit", rows=dtrain.num_row()):
+            booster = xg.train(self.params, dtrain, num_boost_round=self.num_boost_round)
+        
+        # Wrapped in the scikit-learn interface the rest of the package uses
+        self.model = xg.XGBRegressor()
+        self.model.load_model(bytearray(booster.save_raw("ubj")))
+        return self.model
@@ -0,0 +1,119 @@
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import xgboost as xg
+from sklearn.model_selection import train_test_split
+
+from bikeshare.utils.metrics import MetricsStore
+from bikeshare.utils.postprocessing import ModelSaving
+
+# Training and validation matrices, set once per worker process by _init_worker
+_worker_data = {}
+
+
+def _init_worker(X_fit, y_fit, X_val, y_val, n_jobs):
+    _worker_data.update(X_fit=X_fit, y_fit=y_fit, X_val=X_val, y_val=y_val, n_jobs=n_jobs)
+
+
+def _run_trial(trial_id, params, n_estimators, early_stopping_rounds, random_state):
+    """ Fits one configuration with early stopping on the validation split and scores it """
+    model = xg.XGBRegressor(
+        objective='reg:squarederror',
+        n_estimators=n_estimators,
+        early_stopping_rounds=early_stopping_rounds,
+        random_state=random_state,
+        n_jobs=_worker_data["n_jobs"],
+        **params
+    )
+    model.fit(
+        _worker_data["X_fit"], _worker_data["y_fit"],
+        eval_set=[(_worker_data["X_val"], _worker_data["y_val"])],
+        verbose=False
+    )
+    y_val_pred = model.predict(_worker_data["X_val"])
+    return {
+        "trial_id": trial_id,
+        "params": params,
+        "n_estimators": n_estimators,
+        "best_iteration": int(model.best_iteration),
+        "metrics": ModelSaving.get_model_metrics(_worker_data["y_val"], y_val_pred)
+    }
+
+
+class HyperparameterSearch():
+    """ Random search over the configured space, pruned with successive halving
+
+    Every rung fits the surviving trials in parallel with a larger n_estimators budget and keeps the best
+    1/reduction_factor of them by validation RMSE, so only the most promising trials get full-size fits.
+    """
+
+    def __init__(self, search_config, random_state, max_estimators):
+        self.config = search_config
+        self.random_state = random_state
+        self.max_estimators = max_estimators
+        self.n_workers = search_config.n_workers or os.cpu_count()
+
+    def sample_trials(self):
+        """ Draws n_trials distinct parameter combinations from the configured space """
+        space = vars(self.config.space)
+        names = sorted(space)
+        grid = list(itertools.product(*(space[name] for name in names)))
+        rng = np.random.default_rng(self.random_state)
+        picked = rng.choice(len(grid), size=min(self.config.n_trials, len(grid)), replace=False)
+        return [dict(zip(names, grid[index])) for index in picked]
+
+    def rung_budgets(self):
+        """ n_estimators per rung, growing by reduction_factor up to max_estimators """
+        eta = self.config.reduction_factor
+        n_rungs = int(math.floor(math.log(self.max_estimators / self.config.min_estimators, eta))) + 1
+        return [int(round(self.max_estimators / eta ** (n_rungs - 1 - rung))) for rung in range(n_rungs)]
+
+    def run(self, X_train, y_train):
+        """ Runs the search, returning the best trial and the history of every trial at every rung """
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            X_train, y_train, test_size=self.config.validation_size, random_state=self.random_state
+        )
+        trials = dict(enumerate(self.sample_trials()))
+        n_jobs = max(1, os.cpu_count() // self.n_workers)
+        history = []
+
+        with ProcessPoolExecutor(
+            max_workers=self.n_workers, initializer=_init_worker, initargs=(X_fit, y_fit, X_val, y_val, n_jobs)
+        ) as executor:
+            for rung, budget in enumerate(self.rung_budgets()):
+                futures = [
+                    executor.submit(
+                        _run_trial, trial_id, params, budget, self.config.early_stopping_rounds, self.random_state
+                    )
+                    for trial_id, params in trials.items()
+                ]
+                results = sorted((future.result() for future in futures), key=lambda result: result["metrics"]["RMSE"])
+                for result in results:
+                    result["rung"] = rung
+                history.extend(results)
+                print(f"Rung {rung}: {len(results)} trials with n_estimators={budget}, "
+                      f"best validation RMSE {results[0]['metrics']['RMSE']:.2f}")
+
+                n_keep = max(1, len(results) // self.config.reduction_factor)
+                trials = {result["trial_id"]: result["params"] for result in results[:n_keep]}
+
+        return results[0], history
+
+    @staticmethod
+    def save_results(best, history, model_name, output_config, timestamp=None):
+        """ Appends every trial at every rung and the best trial to the model's metrics store """
+        timestamp = timestamp or ModelSaving.get_current_timestamp()
+        store = MetricsStore(model_name, output_config)
+        for result in history:
+            store.append(
+                result["metrics"], timestamp, search=True, trial_id=result["trial_id"], rung=result["rung"],
+                n_estimators=result["n_estimators"], best_iteration=result["best_iteration"], params=result["params"]
+            )
+        store.append(
+            best["metrics"], timestamp, search="best", trial_id=best["trial_id"], rung=best["rung"],
+            n_estimators=best["n_estimators"], best_iteration=best["best_iteration"], params=best["params"]
+        )
+        return print("Saved search metrics to: ", store.filepath)
@@ -1,11 +1,22 @@
 from abc import ABC, abstractmethod
+import os
+
 from bikeshare.utils.config import Config
+from bikeshare.utils.postprocessing import ModelSaving
+from bikeshare.utils.profiling import StageProfiler
 
 class BaseModel(ABC):
     """ Base class for all models """
     
     def __init__(self, cfg):
         self.config = Config.from_json(cfg)
+        self.profiler = None
+        
+    def start_profiling(self, cprofile=False):
+        """ Records the stages of every following pipeline step to <output_path>/<name>_profile_<run>.json """
+        run = ModelSaving.get_current_timestamp()
+        filepath = os.path.join(self.config.output.output_path, f"{self._name}_profile_{run}.json")
+        self.profiler = StageProfiler(filepath, cprofile=cprofile, model=self._name, run=run)
         
     @abstractmethod
     def load_data(self):
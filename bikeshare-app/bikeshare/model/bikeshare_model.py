@@ -1,71 +1,217 @@
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.ensemble import RandomForestRegressor
 import xgboost as xg
+import numpy as np
+import os
 
 from datetime import datetime
 from .base_model import BaseModel
 from bikeshare.dataloader.dataloader import DataLoader
-from bikeshare.executor.trainer import ModelTrainer
+from bikeshare.dataloader.preprocessor import Preprocessor
+from bikeshare.executor.cross_validation import CrossValidation
+from bikeshare.executor.registry import ModelRegistry
+from bikeshare.executor.trainer import ModelTrainer, ExternalMemoryTrainer
+from bikeshare.executor.tuner import HyperparameterSearch
 from bikeshare.utils.postprocessing import ModelSaving
+from bikeshare.utils.metrics import RegressionMetrics
+from bikeshare.utils.profiling import profiled, stage
 
 
 class BikeshareXGBoost(BaseModel):
     def __init__(self, config):
         super().__init__(config)
         self._name = "XGBoost"
+        if self.config.output.profile:
+            self.start_profiling(self.config.output.cprofile)
         
+    @profiled("load_data")
     def load_data(self):
         """ Load data """
-        self.dataset = DataLoader().load_data(self.config.data)
+        if self.config.gradient_boosting.external_memory:
+            # Only the preprocessed shard paths are kept in memory
+            self.col_transformer, self.train_shards, self.test_shards = \
+                DataLoader().preprocess_data_streaming(self.config.data, self.config.data.shard_dir)
+            return
+        # Shared with every other model trained on the same data and data config
         self.X, self.y, self.X_train, self.X_test, self.y_train, self.y_test, \
-            self.col_transformer = DataLoader().preprocess_data(self.config.data, dataset = self.dataset)
+            self.col_transformer = DataLoader().load_preprocessed_data(self.config.data)
             
             
+    @profiled("build")
     def build(self):
         """ Build the model """
         self.model = xg.XGBRegressor()
         print("\nXGBoost model built")
         
         
-    def train(self):
-        """ Complies and trains the model with the configured hyperparameters """
-        print("Setting the XGBoost training parameters")
-        self.model = xg.XGBRegressor(
-            objective='reg:squarederror',
+    @profiled("search")
+    def search(self):
+        """ Searches the configured hyperparameter space and keeps the best configuration for train """
+        if self.config.gradient_boosting.external_memory:
+            # load_data then only keeps shard paths, while every trial is fitted on in-memory matrices
+            raise ValueError(
+                "search needs the training matrices in memory, run it with gradient_boosting.external_memory off"
+            )
+        search = HyperparameterSearch(
+            self.config.search,
+            random_state=self.config.data.random_state,
+            max_estimators=self.config.gradient_boosting.n_estimators
+        )
+        best, history = search.run(self.X_train, self.y_train)
+        HyperparameterSearch.save_results(best, history, self._name, self.config.output.output_path)
+        
+        for name, value in best["params"].items():
+            setattr(self.config.gradient_boosting, name, value)
+        self.config.gradient_boosting.n_estimators = best["best_iteration"] + 1
+        print(f"Best parameters: {best['params']}, n_estimators={self.config.gradient_boosting.n_estimators}")
+        
+        
+    @profiled("cross_validate")
+    def cross_validate(self):
+        """ Scores the configured hyperparameters on rolling-origin time-series folds, fitted in parallel """
+        X, y, hours, _ = DataLoader().load_time_ordered_data(self.config.data)
+        params = {
+            "max_depth": self.config.gradient_boosting.max_depth,
+            "subsample": self.config.gradient_boosting.subsample,
+            "learning_rate": self.config.gradient_boosting.learning_rate
+        }
+        cross_validation = CrossValidation(
+            self.config.cross_validation, params,
             n_estimators=self.config.gradient_boosting.n_estimators,
-            max_depth=self.config.gradient_boosting.max_depth,
-            subsample=self.config.gradient_boosting.subsample,
-            learning_rate=self.config.gradient_boosting.learning_rate,
             random_state=self.config.data.random_state
         )
+        self.cv_results = cross_validation.run(X, y, hours)
+        self.cv_metrics, _ = CrossValidation.summarize(self.cv_results)
+        CrossValidation.save_results(self.cv_results, self._name, self.config.output.output_path)
+        
+    @profiled("train")
+    def train(self):
+        """ Complies and trains the model with the configured hyperparameters """
+        print("Setting the XGBoost training parameters")
+        if self.config.gradient_boosting.external_memory:
+            params = {
+                "objective": "reg:squarederror",
+                "tree_method": "hist",
+                "max_depth": self.config.gradient_boosting.max_depth,
+                "subsample": self.config.gradient_boosting.subsample,
+                "learning_rate": self.config.gradient_boosting.learning_rate,
+                "seed": self.config.data.random_state
+            }
+            trainer = ExternalMemoryTrainer(
+                params,
+                num_boost_round=self.config.gradient_boosting.n_estimators,
+                shard_paths=self.train_shards,
+                cache_prefix=os.path.join(self.config.data.shard_dir, "xgb-cache")
+            )
+        else:
+            self.model = xg.XGBRegressor(
+                objective='reg:squarederror',
+                n_estimators=self.config.gradient_boosting.n_estimators,
+                max_depth=self.config.gradient_boosting.max_depth,
+                subsample=self.config.gradient_boosting.subsample,
+                learning_rate=self.config.gradient_boosting.learning_rate,
+                random_state=self.config.data.random_state
+            )
+            trainer = ModelTrainer(
+                self.model,
+                X_train=self.X_train,
+                y_train=self.y_train
+            )
         print("XGBoost training is started")
         start_time = datetime.now()
-        trainer = ModelTrainer(
-            self.model,
-            X_train=self.X_train,
-            y_train=self.y_train
-        )
         trainer.train()
+        self.model = trainer.model
+        # Keys this run's metrics and exported model
+        self.timestamp = ModelSaving.get_current_timestamp()
+        if self.profiler is not None:
+            self.profiler.info["timestamp"] = self.timestamp
         end_time = datetime.now()  
         training_time = (end_time - start_time).total_seconds()
         print(f"XGBoost training is completed. Time taken: {"{:.2f}".format(training_time)} seconds")
         
+    @profiled("evaluate")
     def evaluate(self):
         """ XGBoost predicts the results for the test data"""
-        self.y_test_pred = self.model.predict(self.X_test)
         output_config = self.config.output.output_path
-        ModelSaving().save_model_metrics(self.y_test, self.y_test_pred, self._name, output_config)
+        if self.config.gradient_boosting.external_memory:
+            self.test_metrics = self.evaluate_shards(self.test_shards)
+            ModelSaving().append_model_metrics(self.test_metrics, self._name, output_config, self.timestamp)
+        else:
+            with stage("predict", rows=self.X_test.shape[0]):
+                self.y_test_pred = self.model.predict(self.X_test)
+            ModelSaving().save_model_metrics(self.y_test, self.y_test_pred, self._name, output_config, self.timestamp)
         print("XGBoost model evaluation on test test completed, check model attributes for results")
         
+    def evaluate_shards(self, shard_paths):
+        """ Accumulates the test metrics shard by shard, without holding all predictions in memory """
+        metrics = RegressionMetrics()
+        with stage("predict") as record:
+            record["rows"] = 0
+            for shard_path in shard_paths:
+                with np.load(shard_path) as shard:
+                    metrics.update(shard["y"], self.model.predict(shard["X"]))
+                    record["rows"] += len(shard["y"])
+        return metrics.result()
+        
+    @profiled("update")
+    def update(self, new_data):
+        """ Ingests new hourly rows and adds trees for them to the current booster instead of refitting
+        
+        Continues from the model trained in this process, or else the newest exported one, and keeps its
+        preprocessor so the new trees see the same features (unseen categories are encoded as all zeros).
+        Call export_model afterwards to save it.
+        """
+        train, test = DataLoader().ingest(self.config.data, new_data)
+        if not hasattr(self, "timestamp"):
+            loaded = ModelRegistry(self.config.output.output_path).current(self._name)
+            self.col_transformer, self.model = loaded.preprocessor, loaded.model
+        if not isinstance(self.col_transformer, Preprocessor):
+            self.col_transformer = Preprocessor.from_col_transformer(self.col_transformer)
+        if train.empty:
+            return print("No new training rows, the model is unchanged")
+        
+        print(f"Adding {self.config.gradient_boosting.warm_start_estimators} trees for {len(train)} new rows")
+        model = xg.XGBRegressor(
+            objective='reg:squarederror',
+            n_estimators=self.config.gradient_boosting.warm_start_estimators,
+            max_depth=self.config.gradient_boosting.max_depth,
+            subsample=self.config.gradient_boosting.subsample,
+            learning_rate=self.config.gradient_boosting.learning_rate,
+            random_state=self.config.data.random_state
+        )
+        start_time = datetime.now()
+        model.fit(
+            self.col_transformer.transform(train[self.config.data.X], handle_unknown="ignore"),
+            train[self.config.data.y].to_numpy(),
+            xgb_model=self.model.get_booster()
+        )
+        self.model = model
+        self.timestamp = ModelSaving.get_current_timestamp()
+        if self.profiler is not None:
+            self.profiler.info["timestamp"] = self.timestamp
+        training_time = (datetime.now() - start_time).total_seconds()
+        print(f"XGBoost warm start is completed. Time taken: {training_time:.2f} seconds")
+        
+        # Scored on the new test rows only
+        if not test.empty:
+            self.y_test = test[self.config.data.y].to_numpy()
+            X_test = self.col_transformer.transform(test[self.config.data.X], handle_unknown="ignore")
+            self.y_test_pred = self.model.predict(X_test)
+            ModelSaving().save_model_metrics(self.y_test, self.y_test_pred, self._name, self.config.output.output_path, self.timestamp)
+        
     def evaluate_new_data(self, new_data):
         """ Predicts the results for the new data """
         new_data = self.col_transformer.transform(new_data)
         return self.model.predict(new_data)
         
+    @profiled("export_model")
     def export_model(self):
         """ Saves the model """
         output_config = self.config.output.output_path
-        ModelSaving().save_model_with_timestamp(self.col_transformer, self.model, self._name, output_config)
+        ModelSaving().save_model_with_timestamp(
+            self.col_transformer, self.model, self._name, output_config, self.timestamp,
+            export_onnx=self.config.output.export_onnx
+        )
 
 # class BikeshareDecisionTree(BaseModel):
 #     def __init__(self, config):
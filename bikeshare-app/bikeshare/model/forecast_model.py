@@ -0,0 +1,179 @@
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .base_model import BaseModel
+from bikeshare.dataloader.panel import PanelFeatures, StationPanel
+from bikeshare.executor.registry import ModelRegistry
+from bikeshare.executor.trainer import ExternalMemoryTrainer
+from bikeshare.utils.metrics import MetricsStore, RegressionMetrics
+from bikeshare.utils.postprocessing import ModelSaving
+from bikeshare.utils.profiling import profiled, stage
+
+# Test metrics are also reported per day of the horizon
+HORIZON_BUCKET = 24
+
+
+class BikeshareForecaster(BaseModel):
+    """ Forecasts the next 1..horizon hours of every station with one XGBoost model shared by all stations
+
+    The station and the horizon are features, so one prediction call scores every horizon of a group of
+    stations. Training rows are written to shards one station group at a time and trained on with external
+    memory, so memory is bounded by forecasting.max_group_rows rather than by the number of stations.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._name = "Forecaster"
+        if self.config.output.profile:
+            self.start_profiling(self.config.output.cprofile)
+
+    @profiled("load_data")
+    def load_data(self):
+        """ Loads the station x hour panel """
+        forecasting = self.config.forecasting
+        with stage("read_csv") as record:
+            data = pd.read_csv(forecasting.path, parse_dates=[forecasting.datetime])
+            record["rows"] = len(data)
+        self.panel = StationPanel.from_frame(data, forecasting)
+        # Targets in the last test_hours are only used for evaluation
+        self.test_start = self.panel.n_hours - forecasting.test_hours
+        print(f"Loaded {len(self.panel.stations)} stations over {self.panel.n_hours} hours")
+
+    @profiled("build")
+    def build(self):
+        """ Build the feature definition """
+        forecasting = self.config.forecasting
+        self.features = PanelFeatures(
+            self.panel.stations, forecasting.lags, forecasting.windows, forecasting.periods,
+            forecasting.exog, forecasting.horizon
+        )
+        print("\nForecaster features built")
+
+    def horizons(self):
+        return np.arange(1, self.features.horizon + 1)
+
+    def station_groups(self, n_origins):
+        return PanelFeatures.station_groups(
+            len(self.panel.stations), n_origins * self.features.horizon, self.config.forecasting.max_group_rows
+        )
+
+    @profiled("train")
+    def train(self):
+        """ Writes the training rows to shards station group by station group and trains on them """
+        print("Setting the Forecaster training parameters")
+        forecasting = self.config.forecasting
+        params = {
+            "objective": "reg:squarederror",
+            "tree_method": "hist",
+            "max_depth": self.config.gradient_boosting.max_depth,
+            "subsample": self.config.gradient_boosting.subsample,
+            "learning_rate": self.config.gradient_boosting.learning_rate,
+            "seed": self.config.data.random_state
+        }
+        # Origins with a complete lookback whose first target falls before the test period
+        origins = np.arange(self.features.lookback - 1, self.test_start - 1, forecasting.origin_stride)
+
+        shutil.rmtree(forecasting.shard_dir, ignore_errors=True)
+        os.makedirs(forecasting.shard_dir)
+        shard_paths = []
+        with stage("write_shards") as record:
+            record["rows"] = 0
+            for index, stations in enumerate(self.station_groups(len(origins))):
+                X, y = self.features.build(self.panel, stations, origins, self.horizons(), end=self.test_start)
+                observed = ~np.isnan(y)
+                if not observed.any():
+                    continue
+                shard_path = os.path.join(forecasting.shard_dir, f"train-{index:05d}.npz")
+                np.savez(shard_path, X=X[observed], y=y[observed])
+                shard_paths.append(shard_path)
+                record["rows"] += int(observed.sum())
+
+        trainer = ExternalMemoryTrainer(
+            params,
+            num_boost_round=self.config.gradient_boosting.n_estimators,
+            shard_paths=shard_paths,
+            cache_prefix=os.path.join(forecasting.shard_dir, "xgb-cache")
+        )
+        print("Forecaster training is started")
+        start_time = datetime.now()
+        self.model = trainer.train()
+        self.timestamp = ModelSaving.get_current_timestamp()
+        if self.profiler is not None:
+            self.profiler.info["timestamp"] = self.timestamp
+        training_time = (datetime.now() - start_time).total_seconds()
+        print(f"Forecaster training is completed. Time taken: {training_time:.2f} seconds")
+
+    @profiled("evaluate")
+    def evaluate(self):
+        """ Forecasts from every origin_stride-th hour of the test period and scores the targets inside it """
+        origins = np.arange(self.test_start - 1, self.panel.n_hours - 1, self.config.forecasting.origin_stride)
+        horizons = self.horizons()
+        metrics = RegressionMetrics()
+        bucket_metrics = {}
+        with stage("predict") as record:
+            record["rows"] = 0
+            for stations in self.station_groups(len(origins)):
+                X, y = self.features.build(self.panel, stations, origins, horizons)
+                observed = ~np.isnan(y)
+                y_pred = self.model.predict(X[observed])
+                metrics.update(y[observed], y_pred)
+                buckets = (X[observed, self.features.feature_names.index("horizon")].astype(np.int64) - 1) // HORIZON_BUCKET
+                for bucket in np.unique(buckets):
+                    in_bucket = buckets == bucket
+                    bucket_metrics.setdefault(int(bucket), RegressionMetrics()).update(y[observed][in_bucket], y_pred[in_bucket])
+                record["rows"] += int(observed.sum())
+
+        output_config = self.config.output.output_path
+        self.test_metrics = metrics.result()
+        ModelSaving().append_model_metrics(self.test_metrics, self._name, output_config, self.timestamp)
+        store = MetricsStore(self._name, output_config)
+        self.horizon_metrics = {}
+        for bucket, bucket_metric in sorted(bucket_metrics.items()):
+            label = f"{bucket * HORIZON_BUCKET + 1}-{min((bucket + 1) * HORIZON_BUCKET, horizons[-1])}"
+            self.horizon_metrics[label] = bucket_metric.result()
+            store.append(self.horizon_metrics[label], self.timestamp, horizons=label)
+        print("Forecaster evaluation on the test period completed, check model attributes for results")
+
+    def load_model(self):
+        """ Continues with the newest exported forecaster instead of training one """
+        loaded = ModelRegistry(self.config.output.output_path).current(self._name)
+        self.features, self.model = loaded.preprocessor, loaded.model
+
+    @profiled("forecast")
+    def forecast(self, origin=None, weather=None):
+        """ Forecasts the next horizon hours of every station in one batched pass per station group
+
+        origin is the last observed hour, by default the last hour of the panel. weather holds the exog columns
+        of the forecast hours indexed by datetime, e.g. a weather forecast. Returns one row per station and hour.
+        """
+        origin = self.panel.n_hours - 1 if origin is None else self.panel.hour_index(origin)
+        horizons = self.horizons()
+        exog = self.panel.exog_until(origin + horizons[-1] + 1, weather)
+        predictions = np.empty((len(self.panel.stations), len(horizons)), dtype=np.float32)
+        with stage("predict", rows=predictions.size):
+            for stations in self.station_groups(1):
+                X, _ = self.features.build(self.panel, stations, [origin], horizons, exog)
+                predictions[stations] = self.model.predict(X).reshape(-1, len(horizons))
+
+        return pd.DataFrame({
+            "station": np.repeat(self.panel.stations, len(horizons)),
+            "origin": self.panel.times([origin])[0],
+            "datetime": np.tile(self.panel.times(origin + horizons), len(self.panel.stations)),
+            "horizon": np.tile(horizons, len(self.panel.stations)),
+            "prediction": predictions.ravel()
+        })
+
+    def evaluate_new_data(self, new_data):
+        """ Forecasts the hours after new data, one row per station and hour with at least the lookback history """
+        self.panel = StationPanel.from_frame(new_data, self.config.forecasting)
+        return self.forecast()
+
+    @profiled("export_model")
+    def export_model(self):
+        """ Saves the model """
+        output_config = self.config.output.output_path
+        ModelSaving().save_model_with_timestamp(self.features, self.model, self._name, output_config, self.timestamp)
@@ -0,0 +1,72 @@
+import asyncio
+
+
+class RequestCoalescer:
+    """ Groups concurrent prediction requests into micro-batches
+
+    A batch is sent as soon as it holds max_batch_size records or max_latency seconds have passed since its
+    first request, whichever comes first. Batches run one at a time in a worker thread, so the event loop
+    keeps accepting requests while the model is busy.
+    """
+
+    def __init__(self, infer_batch, max_batch_size, max_latency):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def submit(self, records):
+        """ Queues a list of records and waits for their predictions """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((records, future))
+        return await future
+
+    async def _collect(self):
+        """ Waits for a first request, then gathers more until the batch is full or the latency window ends """
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = loop.time() + self.max_latency
+        while size < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            records = [record for request_records, _ in batch for record in request_records]
+            try:
+                predictions = await loop.run_in_executor(None, self.infer_batch, records)
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            start = 0
+            for request_records, future in batch:
+                end = start + len(request_records)
+                if not future.done():
+                    future.set_result(predictions[start:end])
+                start = end
@@ -0,0 +1,157 @@
+""" ASGI prediction server for the bikeshare XGBoost model
+
+Run with e.g. `uvicorn bikeshare.serving.server:app --workers 4`; every worker loads the model once at
+startup and coalesces concurrent requests into micro-batches.
+
+    POST /predict             one record                      -> {"prediction": float}
+    POST /predict_batch       {"records": [record, ...]}      -> {"predictions": [float, ...]}
+    GET  /feature_importance                                  -> {"feature_importance": {name: float}}
+    POST /explain             {"records": [record, ...]}      -> {"feature_names": [...], "contributions": [[float, ...], ...]}
+"""
+import asyncio
+import json
+
+import numpy as np
+
+from bikeshare.configs.config import CFGLog
+from bikeshare.executor.inferrer import Inferrer
+from bikeshare.serving.coalescer import RequestCoalescer
+from bikeshare.utils.config import Config
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class PredictionServer:
+    """ Minimal ASGI application wrapping one Inferrer per worker process """
+
+    def __init__(self, cfg=CFGLog):
+        self.config = Config.from_json(cfg)
+        self.inferrer = None
+        self.coalescer = None
+        self.routes = {
+            ("POST", "/predict"): self.predict,
+            ("POST", "/predict_batch"): self.predict_batch,
+            ("GET", "/feature_importance"): self.feature_importance,
+            ("POST", "/explain"): self.explain,
+        }
+
+    async def startup(self):
+        self.inferrer = Inferrer()
+        self.coalescer = RequestCoalescer(
+            self.inferrer.infer_batch,
+            max_batch_size=self.config.serving.max_batch_size,
+            max_latency=self.config.serving.max_latency_ms / 1000.0
+        )
+        self.coalescer.start()
+
+    async def shutdown(self):
+        await self.coalescer.stop()
+
+    @staticmethod
+    async def run_blocking(fn, *args):
+        """ Runs fn in the default executor; anything resolving the current model may load it from disk on a miss
+        or hot swap, which must not stall the other requests on the event loop """
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def validate(self, records):
+        """ Runs every record through the compiled preprocessor, so one bad request cannot fail a whole batch """
+        preprocessor = self.inferrer.xgb_preprocessor
+        row = np.empty((1, preprocessor.n_features), dtype=np.float32)
+        for record in records:
+            if not isinstance(record, dict):
+                raise HTTPError(400, "Each record must be a JSON object")
+            try:
+                preprocessor.transform_record(record, out=row)
+            except KeyError as error:
+                raise HTTPError(400, f"Missing feature {error}")
+            except (TypeError, ValueError) as error:
+                raise HTTPError(400, str(error))
+
+    async def predict(self, body):
+        await self.run_blocking(self.validate, [body])
+        predictions = await self.coalescer.submit([body])
+        return {"prediction": float(predictions[0])}
+
+    async def records(self, body):
+        records = body.get("records") if isinstance(body, dict) else None
+        if not isinstance(records, list):
+            raise HTTPError(400, "Expected {\"records\": [...]}")
+        await self.run_blocking(self.validate, records)
+        return records
+
+    async def predict_batch(self, body):
+        records = await self.records(body)
+        predictions = await self.coalescer.submit(records) if records else []
+        return {"predictions": [float(prediction) for prediction in predictions]}
+
+    async def feature_importance(self, body):
+        return {"feature_importance": await self.run_blocking(self.inferrer.xgb_named_feature_importance)}
+
+    async def explain(self, body):
+        records = await self.records(body)
+        # TreeSHAP is not coalesced with predictions, it runs off the event loop in one call per request
+        contributions = await self.run_blocking(self.inferrer.xgb_contributions, records)
+        return {"feature_names": list(contributions.columns), "contributions": contributions.to_numpy().tolist()}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        try:
+            handler = self.routes.get((scope["method"], scope["path"]))
+            if handler is None:
+                raise HTTPError(404, "Not found")
+            body = await self.read_body(receive)
+            if scope["method"] == "POST":
+                try:
+                    body = json.loads(body)
+                except ValueError:
+                    raise HTTPError(400, "Body must be JSON")
+            status, payload = 200, await handler(body)
+        except HTTPError as error:
+            status, payload = error.status, {"error": error.message}
+        except Exception as error:
+            status, payload = 500, {"error": str(error)}
+
+        response = json.dumps(payload).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(response)).encode())],
+        })
+        await send({"type": "http.response.body", "body": response})
+
+    @staticmethod
+    async def read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as error:
+                    await send({"type": "lifespan.startup.failed", "message": str(error)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+app = PredictionServer()
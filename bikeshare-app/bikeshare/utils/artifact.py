@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+
+import xgboost as xg
+
+from bikeshare.dataloader.panel import PanelFeatures
+from bikeshare.dataloader.preprocessor import Preprocessor
+from bikeshare.utils.hashing import file_hash
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+BOOSTER_FILE = "booster.ubj"
+PREPROCESSOR_FILE = "preprocessor.npz"
+# Optional graph of preprocessor + booster written by OnnxExport
+ONNX_FILE = "model.onnx"
+# Classes that can be saved as the artifact's preprocessor, by the name recorded in the manifest
+PREPROCESSOR_TYPES = {cls.__name__: cls for cls in (Preprocessor, PanelFeatures)}
+
+
+class ModelArtifact(object):
+    """ Model artifact directory: native XGBoost booster, preprocessor arrays, optionally the compiled ONNX graph
+    and a manifest of hashes """
+
+    @staticmethod
+    def is_artifact(path):
+        """ True for a completely written artifact directory """
+        return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+    @staticmethod
+    def save(preprocessor, model, model_name, timestamp, dirpath, onnx_model=None, replace=False):
+        """ Writes the artifact to a temporary directory and renames it into place once complete
+
+        onnx_model is the serialized graph from OnnxExport.convert, stored when given. An existing artifact at
+        dirpath raises FileExistsError, or with replace=True is moved aside and deleted once the new one is in place
+        """
+        if os.path.exists(dirpath) and not replace:
+            raise FileExistsError(f"Model artifact {dirpath} already exists")
+        tmp_dirpath = dirpath + ".tmp"
+        shutil.rmtree(tmp_dirpath, ignore_errors=True)
+        os.makedirs(tmp_dirpath)
+        try:
+            ModelArtifact.write(preprocessor, model, model_name, timestamp, tmp_dirpath, onnx_model)
+        except BaseException:
+            shutil.rmtree(tmp_dirpath, ignore_errors=True)
+            raise
+
+        # A directory cannot be renamed over a non-empty one, so the old artifact is swapped out first
+        old_dirpath = dirpath + ".old"
+        if os.path.exists(dirpath):
+            shutil.rmtree(old_dirpath, ignore_errors=True)
+            os.replace(dirpath, old_dirpath)
+        os.replace(tmp_dirpath, dirpath)
+        shutil.rmtree(old_dirpath, ignore_errors=True)
+        return dirpath
+
+    @staticmethod
+    def write(preprocessor, model, model_name, timestamp, dirpath, onnx_model=None):
+        """ Writes the artifact files and their manifest into the existing directory dirpath """
+        model.save_model(os.path.join(dirpath, BOOSTER_FILE))
+        preprocessor.save(os.path.join(dirpath, PREPROCESSOR_FILE))
+        filenames = [BOOSTER_FILE, PREPROCESSOR_FILE]
+        if onnx_model is not None:
+            with open(os.path.join(dirpath, ONNX_FILE), "wb") as outputfile:
+                outputfile.write(onnx_model)
+            filenames.append(ONNX_FILE)
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "model_name": model_name,
+            "timestamp": timestamp,
+            "xgboost_version": xg.__version__,
+            "preprocessor_type": type(preprocessor).__name__,
+            "feature_names": preprocessor.feature_names,
+            "files": {
+                filename: file_hash(os.path.join(dirpath, filename))
+                for filename in filenames
+            }
+        }
+        with open(os.path.join(dirpath, MANIFEST_FILE), "w") as outputfile:
+            json.dump(manifest, outputfile, indent=4)
+
+    @staticmethod
+    def load_manifest(dirpath):
+        with open(os.path.join(dirpath, MANIFEST_FILE)) as inputfile:
+            return json.load(inputfile)
+
+    @staticmethod
+    def verify(dirpath, filenames):
+        """ Checks the manifest version and the hashes of filenames, returns the manifest """
+        manifest = ModelArtifact.load_manifest(dirpath)
+        if manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported artifact format version {manifest['format_version']} in {dirpath}")
+
+        for filename in filenames:
+            if filename not in manifest["files"]:
+                raise FileNotFoundError(f"No {filename} in artifact {dirpath}")
+            if file_hash(os.path.join(dirpath, filename)) != manifest["files"][filename]:
+                raise ValueError(f"Hash mismatch for {filename} in {dirpath}")
+        return manifest
+
+    @staticmethod
+    def load(dirpath, verify=True):
+        """ Loads (preprocessor, model) from an artifact directory without unpickling anything """
+        manifest = ModelArtifact.verify(dirpath, [BOOSTER_FILE, PREPROCESSOR_FILE] if verify else [])
+
+        # Artifacts written before the manifest recorded the type all hold a Preprocessor
+        preprocessor_type = PREPROCESSOR_TYPES[manifest.get("preprocessor_type", "Preprocessor")]
+        preprocessor = preprocessor_type.load(os.path.join(dirpath, PREPROCESSOR_FILE))
+        model = xg.XGBRegressor()
+        model.load_model(os.path.join(dirpath, BOOSTER_FILE))
+        return preprocessor, model
+
+    @staticmethod
+    def load_onnx(dirpath, verify=True):
+        """ Loads (preprocessor, path of the ONNX graph) without loading the booster """
+        ModelArtifact.verify(dirpath, [ONNX_FILE, PREPROCESSOR_FILE] if verify else [])
+        onnx_path = os.path.join(dirpath, ONNX_FILE)
+        if not os.path.isfile(onnx_path):
+            raise FileNotFoundError(f"No {ONNX_FILE} in artifact {dirpath}")
+        return Preprocessor.load(os.path.join(dirpath, PREPROCESSOR_FILE)), onnx_path
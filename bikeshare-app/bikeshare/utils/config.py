@@ -3,17 +3,26 @@ import json
 class Config:
     
     
-    def __init__(self, data, gradient_boosting, output):
+    def __init__(self, data, gradient_boosting, output, search=None, serving=None, forecasting=None,
+                 cross_validation=None):
         self.data = data
         self.gradient_boosting = gradient_boosting
         self.output = output
+        self.search = search
+        self.serving = serving
+        self.forecasting = forecasting
+        self.cross_validation = cross_validation
         
     @classmethod # class method to load the configuration from a JSON file
     def from_json(cls, cfg):
         """ Creates config from json file """
         params = json.loads(json.dumps(cfg), object_hook=HelperDict)
         
-        return cls(params.data, params.gradient_boosting, params.output)
+        return cls(
+            params.data, params.gradient_boosting, params.output,
+            getattr(params, "search", None), getattr(params, "serving", None), getattr(params, "forecasting", None),
+            getattr(params, "cross_validation", None)
+        )
     
     
 class HelperDict(object):
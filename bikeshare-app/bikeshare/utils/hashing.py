@@ -0,0 +1,18 @@
+import hashlib
+
+
+def file_hash(filepath):
+    """ sha256 of a file, read in 1 MB blocks """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as inputfile:
+        for block in iter(lambda: inputfile.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def appended_hash(previous, appended):
+    """ Hash of data extended with the appended bytes, chained from the hash of the data before the append
+
+    Costs time proportional to the appended bytes only; it is a different value than file_hash of the result.
+    """
+    return hashlib.sha256((previous + hashlib.sha256(appended).hexdigest()).encode()).hexdigest()
@@ -0,0 +1,79 @@
+import json
+import os
+
+import numpy as np
+
+
+class RegressionMetrics(object):
+    """ Streaming RMSE/MAE/MSE/R2 accumulator
+
+    Predictions can be added chunk by chunk with update, so evaluating a large hold-out set only needs one
+    chunk in memory. The spread of y_true used by R2 is merged across chunks with Chan's parallel formula.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.sum_abs_error = 0.0
+        self.sum_sq_error = 0.0
+        self.mean_true = 0.0
+        self.sum_sq_true = 0.0
+
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true, dtype=np.float64).ravel()
+        residual = np.asarray(y_pred, dtype=np.float64).ravel() - y_true
+        n_chunk = len(y_true)
+        if n_chunk == 0:
+            return self
+
+        self.sum_sq_error += float(residual @ residual)
+        self.sum_abs_error += float(np.abs(residual).sum())
+
+        mean_chunk = float(y_true.mean())
+        centered = y_true - mean_chunk
+        n_total = self.n + n_chunk
+        delta = mean_chunk - self.mean_true
+        self.sum_sq_true += float(centered @ centered) + delta * delta * self.n * n_chunk / n_total
+        self.mean_true += delta * n_chunk / n_total
+        self.n = n_total
+        return self
+
+    def result(self):
+        if self.n == 0:
+            raise ValueError("No predictions to score, the evaluated data has no rows")
+        mse = self.sum_sq_error / self.n
+        if self.sum_sq_true > 0:
+            r2 = 1.0 - self.sum_sq_error / self.sum_sq_true
+        else:
+            # Constant y_true, scored like sklearn's r2_score
+            r2 = 1.0 if self.sum_sq_error == 0 else 0.0
+        return {
+            "RMSE": float(np.sqrt(mse)),
+            "MAE": self.sum_abs_error / self.n,
+            "MSE": mse,
+            "R2_Score": r2
+        }
+
+
+class MetricsStore(object):
+    """ Append-only JSON-lines file of metric records, one per evaluation, keyed by model timestamp """
+
+    def __init__(self, model_name, output_config):
+        self.model_name = model_name
+        self.filepath = os.path.join(output_config, model_name + "_metrics.jsonl")
+
+    def append(self, metrics, timestamp, **fields):
+        record = {"model": self.model_name, "timestamp": timestamp, **fields, **metrics}
+        with open(self.filepath, "a") as outputfile:
+            outputfile.write(json.dumps(record) + "\n")
+        return record
+
+    def read(self):
+        """ All records, oldest first """
+        if not os.path.isfile(self.filepath):
+            return []
+        with open(self.filepath) as inputfile:
+            return [json.loads(line) for line in inputfile if line.strip()]
+
+    def get(self, timestamp):
+        """ Records of the model saved with the given timestamp """
+        return [record for record in self.read() if record["timestamp"] == timestamp]
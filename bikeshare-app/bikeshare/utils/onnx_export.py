@@ -0,0 +1,174 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+except ImportError:
+    onnx = None
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+ML_DOMAIN = "ai.onnx.ml"
+OPSET = 17
+ML_OPSET = 3
+# Pinned rather than the installed onnx's latest, so the graph also loads in older onnxruntime releases
+IR_VERSION = 8
+# Objectives whose prediction is the raw margin, the only ones the tree ensemble reproduces without a link
+IDENTITY_OBJECTIVES = {"reg:squarederror", "reg:absoluteerror", "reg:pseudohubererror", "reg:quantileerror"}
+
+# Graph inputs: the numeric training columns as float64 and the categorical ones as strings, in the
+# preprocessor's column order
+NUM_INPUT = "num"
+CAT_INPUT = "cat"
+OUTPUT = "prediction"
+
+
+class OnnxExport(object):
+    """ Compiles a Preprocessor and a fitted XGBoost regressor into one ONNX graph
+
+    The graph scales the numeric columns (in float64, like Preprocessor.transform), one-hot encodes the
+    categorical ones and evaluates the trees with the ai.onnx.ml TreeEnsembleRegressor operator, so a
+    runtime only needs onnxruntime and the raw feature values.
+    """
+
+    @staticmethod
+    def available():
+        """ Export needs onnx; the parity check additionally needs onnxruntime """
+        return onnx is not None
+
+    @staticmethod
+    def tree_ensemble_attributes(booster):
+        """ TreeEnsembleRegressor attributes equivalent to the booster's trees """
+        learner = json.loads(booster.save_raw("json"))["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f"Objective {objective} is not supported by the ONNX export")
+        if learner["gradient_booster"]["name"] != "gbtree":
+            raise ValueError("Only gbtree boosters are supported by the ONNX export")
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+
+        nodes = {name: [] for name in (
+            "nodes_treeids", "nodes_nodeids", "nodes_featureids", "nodes_modes", "nodes_values",
+            "nodes_truenodeids", "nodes_falsenodeids", "nodes_missing_value_tracks_true", "nodes_hitrates"
+        )}
+        targets = {name: [] for name in ("target_treeids", "target_nodeids", "target_ids", "target_weights")}
+        for tree_id, tree in enumerate(learner["gradient_booster"]["model"]["trees"]):
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported by the ONNX export")
+            left, right = tree["left_children"], tree["right_children"]
+            for node_id, (left_id, right_id) in enumerate(zip(left, right)):
+                is_leaf = left_id == -1
+                nodes["nodes_treeids"].append(tree_id)
+                nodes["nodes_nodeids"].append(node_id)
+                nodes["nodes_featureids"].append(0 if is_leaf else tree["split_indices"][node_id])
+                nodes["nodes_modes"].append("LEAF" if is_leaf else "BRANCH_LT")
+                # XGBoost goes left when x < split_condition; a leaf stores its value there instead
+                nodes["nodes_values"].append(0.0 if is_leaf else tree["split_conditions"][node_id])
+                nodes["nodes_truenodeids"].append(0 if is_leaf else left_id)
+                nodes["nodes_falsenodeids"].append(0 if is_leaf else right_id)
+                nodes["nodes_missing_value_tracks_true"].append(0 if is_leaf else int(tree["default_left"][node_id]))
+                nodes["nodes_hitrates"].append(1.0)
+                if is_leaf:
+                    targets["target_treeids"].append(tree_id)
+                    targets["target_nodeids"].append(node_id)
+                    targets["target_ids"].append(0)
+                    targets["target_weights"].append(tree["split_conditions"][node_id])
+
+        return {**nodes, **targets, "n_targets": 1, "aggregate_function": "SUM", "post_transform": "NONE",
+                "base_values": [base_score]}
+
+    @staticmethod
+    def convert(preprocessor, model):
+        """ Returns the serialized ONNX graph of preprocessor + model """
+        if onnx is None:
+            raise ImportError("onnx is required to export the model to ONNX")
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+
+        graph_nodes, initializers, features = [], [], []
+        inputs = []
+        if preprocessor.num_columns:
+            inputs.append(helper.make_tensor_value_info(NUM_INPUT, TensorProto.DOUBLE, [None, len(preprocessor.num_columns)]))
+            initializers += [
+                numpy_helper.from_array(preprocessor.scale, "scale"),
+                numpy_helper.from_array(preprocessor.offset, "offset")
+            ]
+            graph_nodes += [
+                helper.make_node("Mul", [NUM_INPUT, "scale"], ["num_scaled"]),
+                helper.make_node("Add", ["num_scaled", "offset"], ["num_shifted"]),
+                helper.make_node("Cast", ["num_shifted"], ["num_features"], to=TensorProto.FLOAT)
+            ]
+            features.append("num_features")
+
+        if preprocessor.cat_columns:
+            inputs.append(helper.make_tensor_value_info(CAT_INPUT, TensorProto.STRING, [None, len(preprocessor.cat_columns)]))
+            initializers.append(numpy_helper.from_array(np.array([1], dtype=np.int64), "squeeze_axis"))
+            for index, values in enumerate(preprocessor.categories):
+                initializers.append(numpy_helper.from_array(np.array([index], dtype=np.int64), f"cat_index_{index}"))
+                graph_nodes += [
+                    helper.make_node("Gather", [CAT_INPUT, f"cat_index_{index}"], [f"cat_{index}"], axis=1),
+                    # zeros=0 raises on unseen categories, like Preprocessor.transform
+                    helper.make_node(
+                        "OneHotEncoder", [f"cat_{index}"], [f"cat_onehot_{index}"], domain=ML_DOMAIN,
+                        cats_strings=values.tolist(), zeros=0
+                    ),
+                    helper.make_node("Squeeze", [f"cat_onehot_{index}", "squeeze_axis"], [f"cat_features_{index}"])
+                ]
+                features.append(f"cat_features_{index}")
+
+        graph_nodes += [
+            helper.make_node("Concat", features, ["features"], axis=1),
+            helper.make_node(
+                "TreeEnsembleRegressor", ["features"], [OUTPUT], domain=ML_DOMAIN,
+                **OnnxExport.tree_ensemble_attributes(booster)
+            )
+        ]
+        graph = helper.make_graph(
+            graph_nodes, "bikeshare_xgboost", inputs,
+            [helper.make_tensor_value_info(OUTPUT, TensorProto.FLOAT, [None, 1])],
+            initializer=initializers
+        )
+        onnx_model = helper.make_model(
+            graph, opset_imports=[helper.make_opsetid("", OPSET), helper.make_opsetid(ML_DOMAIN, ML_OPSET)],
+            ir_version=IR_VERSION
+        )
+        onnx.checker.check_model(onnx_model)
+        return onnx_model.SerializeToString()
+
+    @staticmethod
+    def parity_frame(preprocessor, n_rows=4096, seed=0):
+        """ Random rows over the fitted value ranges and vocabularies, for comparing the two runtimes """
+        rng = np.random.default_rng(seed)
+        # Inverse of the min-max scaling: 0 and 1 map back to the training minimum and maximum
+        data_min = -preprocessor.offset / preprocessor.scale
+        data_max = (1.0 - preprocessor.offset) / preprocessor.scale
+        frame = pd.DataFrame(
+            rng.uniform(data_min, data_max, size=(n_rows, len(preprocessor.num_columns))),
+            columns=preprocessor.num_columns
+        )
+        for column, values in zip(preprocessor.cat_columns, preprocessor.categories):
+            frame[column] = values[rng.integers(len(values), size=n_rows)]
+        return frame
+
+    @staticmethod
+    def check_parity(onnx_bytes, preprocessor, model, n_rows=4096, rtol=1e-5, atol=1e-2):
+        """ Compares ONNX and XGBoost predictions on parity_frame rows, raises ValueError on a mismatch
+
+        Returns the largest absolute difference, or None when onnxruntime is not installed
+        """
+        if ort is None:
+            print("onnxruntime not installed, skipping the ONNX parity check")
+            return None
+        from bikeshare.executor.onnx_runtime import OnnxModel
+
+        frame = OnnxExport.parity_frame(preprocessor, n_rows)
+        expected = model.predict(preprocessor.transform(frame))
+        actual = OnnxModel(onnx_bytes, preprocessor).predict_frame(frame)
+        if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+            raise ValueError(f"ONNX predictions differ from XGBoost by up to {np.abs(actual - expected).max()}")
+        return float(np.abs(actual - expected).max())
@@ -1,10 +1,14 @@
 import datetime
 import os
 import pickle 
-import numpy as np
 import json
 
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+from bikeshare.dataloader.panel import PanelFeatures
+from bikeshare.dataloader.preprocessor import Preprocessor
+from bikeshare.utils.artifact import ModelArtifact
+from bikeshare.utils.metrics import RegressionMetrics, MetricsStore
+from bikeshare.utils.onnx_export import OnnxExport
+from bikeshare.utils.profiling import stage
 
 class ModelSaving(object):
     
@@ -14,30 +18,63 @@ class ModelSaving(object):
         return now.strftime("%Y-%m-%d_%H-%M-%S")
     
     @staticmethod 
-    def save_model_with_timestamp(col_transformer, model, model_name, output_config):
-        filename = model_name + "_" + ModelSaving.get_current_timestamp() + ".pkl"
+    def save_model_with_timestamp(col_transformer, model, model_name, output_config, timestamp=None, export_onnx=False):
+        # Models pass the timestamp their metrics were recorded under
+        timestamp = timestamp or ModelSaving.get_current_timestamp()
+        
+        # XGBoost models are saved as an artifact directory that loads without unpickling
+        if hasattr(model, "get_booster"):
+            if not isinstance(col_transformer, (Preprocessor, PanelFeatures)):
+                col_transformer = Preprocessor.from_col_transformer(col_transformer)
+            onnx_model = ModelSaving.export_onnx(col_transformer, model) if export_onnx else None
+            dirpath = os.path.join(output_config, model_name + "_" + timestamp)
+            with stage("save_model"):
+                # train and update give every model a new timestamp, so an artifact already saved under this one
+                # holds the same model exported again and is replaced
+                ModelArtifact.save(
+                    col_transformer, model, model_name, timestamp, dirpath, onnx_model=onnx_model, replace=True
+                )
+            return print("Saved model artifact to: ", dirpath)
+        
+        filename = model_name + "_" + timestamp + ".pkl"
         filepath = os.path.join(output_config, filename)
-        with open(filepath, 'wb') as outputfile:
-            pickle.dump((col_transformer, model), outputfile)
+        # Written under a temporary name first so a running ModelRegistry never picks up a partial file
+        with stage("pickle"):
+            with open(filepath + ".tmp", 'wb') as outputfile:
+                pickle.dump((col_transformer, model), outputfile)
+            os.replace(filepath + ".tmp", filepath)
         
         return print("Saved column transformer and model to: ", filepath)
     
     @staticmethod
-    def save_model_metrics(y_true, y_pred, model_name, output_config):
-        rmse = np.sqrt(mean_squared_error(y_true, y_pred))
-        mae = mean_absolute_error(y_true, y_pred)
-        mse = mean_squared_error(y_true, y_pred)
-        r2 = r2_score(y_true, y_pred)
-        metrics = {
-            "RMSE": rmse,
-            "MAE": mae,
-            "MSE": mse,
-            "R2_Score": r2
-        }
-        metrics = {model_name: metrics}
-        filename = model_name + "_metrics" + ".json"
-        filepath = os.path.join(output_config, filename)
-        with open(filepath, 'w') as outputfile:
-            json.dump(metrics, outputfile, indent=4)
+    def export_onnx(preprocessor, model):
+        """ Compiles preprocessor + model to ONNX and checks it against XGBoost, None when onnx is not installed """
+        if not OnnxExport.available():
+            print("onnx not installed, saving the model without the ONNX graph")
+            return None
+        with stage("export_onnx"):
+            onnx_model = OnnxExport.convert(preprocessor, model)
+        with stage("onnx_parity"):
+            difference = OnnxExport.check_parity(onnx_model, preprocessor, model)
+        if difference is not None:
+            print(f"ONNX graph matches XGBoost, largest difference {difference:.6f}")
+        return onnx_model
+    
+    @staticmethod
+    def get_model_metrics(y_true, y_pred):
+        """ RMSE, MAE, MSE and R2 from a single pass over the residuals """
+        with stage("metrics", rows=len(y_true)):
+            return RegressionMetrics().update(y_true, y_pred).result()
+    
+    @staticmethod
+    def append_model_metrics(metrics, model_name, output_config, timestamp=None):
+        """ Appends already computed metrics to the model's metrics store """
+        store = MetricsStore(model_name, output_config)
+        store.append(metrics, timestamp or ModelSaving.get_current_timestamp())
         
-        return print("Saved model metrics to: ", filepath)
\ No newline at end of file
+        return print("Saved model metrics to: ", store.filepath)
+    
+    @staticmethod
+    def save_model_metrics(y_true, y_pred, model_name, output_config, timestamp=None):
+        metrics = ModelSaving.get_model_metrics(y_true, y_pred)
+        return ModelSaving.append_model_metrics(metrics, model_name, output_config, timestamp)
@@ -0,0 +1,143 @@
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Profiler collecting the stages run in this process, None while profiling is off
+_active = None
+
+
+def read_peak_rss():
+    """ Peak resident set size in MB since the last reset_peak_rss, or since the process started """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def reset_peak_rss():
+    """ Resets the peak RSS to the current RSS where Linux allows it, returns whether it did """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageProfiler(object):
+    """ Records wall time, CPU time, peak RSS and row counts of the nested stages of a pipeline run
+
+    Stages are opened with stage() anywhere in the package and nest by call order, e.g. "train/fit". Every
+    time an outermost stage finishes the whole run is rewritten to filepath as JSON, and, when enabled, the
+    cProfile statistics of the run so far to the same path with a .prof suffix.
+    """
+
+    def __init__(self, filepath, cprofile=False, **info):
+        self.filepath = filepath
+        self.info = info
+        self.stages = []
+        self._open = []
+        self._cprofile = cProfile.Profile() if cprofile else None
+        # Without a resettable peak every stage reports the process peak so far
+        self.peak_scope = "stage" if reset_peak_rss() else "process"
+
+    def start(self, name):
+        peak = read_peak_rss()
+        for record in self._open:
+            record["peak_rss_mb"] = max(record["peak_rss_mb"] or 0, peak or 0)
+        if self.peak_scope == "stage":
+            reset_peak_rss()
+        path = "/".join([record["stage"] for record in self._open] + [name])
+        record = {"stage": path, "rows": None, "peak_rss_mb": None}
+        record["_start"] = (time.perf_counter(), time.process_time())
+        self._open.append(record)
+        return record
+
+    def finish(self, record):
+        wall_start, cpu_start = record.pop("_start")
+        record["wall_s"] = time.perf_counter() - wall_start
+        record["cpu_s"] = time.process_time() - cpu_start
+        peak = read_peak_rss()
+        for open_record in self._open:
+            open_record["peak_rss_mb"] = max(open_record["peak_rss_mb"] or 0, peak or 0)
+        self._open.remove(record)
+        self.stages.append(record)
+        if not self._open:
+            self.save()
+
+    def save(self):
+        """ Writes the stages finished so far, in completion order """
+        os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+        with open(self.filepath + ".tmp", "w") as outputfile:
+            json.dump({**self.info, "peak_rss_scope": self.peak_scope, "stages": self.stages}, outputfile, indent=4)
+        os.replace(self.filepath + ".tmp", self.filepath)
+        if self._cprofile is not None:
+            # dump_stats stops the profiler
+            self._cprofile.dump_stats(os.path.splitext(self.filepath)[0] + ".prof")
+            self._cprofile.enable()
+
+    @contextmanager
+    def activate(self):
+        """ Collects the stages run inside the block, unless another profiler is already collecting """
+        global _active
+        if _active is not None:
+            yield _active
+            return
+        _active = self
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        try:
+            yield self
+        finally:
+            if self._cprofile is not None:
+                self._cprofile.disable()
+            _active = None
+
+
+@contextmanager
+def stage(name, rows=None):
+    """ Times the block as a stage of the active profiler and yields its record; a no-op while profiling is off
+
+    Set record["rows"] inside the block when the row count is only known there
+    """
+    profiler = _active
+    if profiler is None:
+        yield {}
+        return
+    record = profiler.start(name)
+    record["rows"] = rows
+    try:
+        yield record
+    finally:
+        profiler.finish(record)
+
+
+def profiled(name):
+    """ Runs a model method as a stage, with the model's profiler (if it has one) active """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, "profiler", None)
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            with profiler.activate(), stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,87 @@
+# Load test for the prediction server, e.g.
+#   uvicorn bikeshare.serving.server:app --port 8000 --workers 4
+#   python scripts/load_test.py --port 8000 --concurrency 64 --duration 20
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+RECORD = {
+    'hour': 8,
+    'temp': 15.0,
+    'humidity': 55,
+    'wind_speed': 1.5,
+    'visibility': 2000,
+    'solar_rad': 0.5,
+    'rainfall': 0.0,
+    'snowfall': 0.0,
+    'seasons': 'Spring',
+    'holiday': 'No Holiday',
+    'day': 'Monday',
+    'month': 'April'
+}
+
+
+def build_request(host, path, batch_size):
+    payload = RECORD if batch_size == 0 else {"records": [RECORD] * batch_size}
+    body = json.dumps(payload).encode()
+    head = (
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode()
+    return head + body
+
+
+async def read_response(reader):
+    """ Reads one HTTP/1.1 response from a keep-alive connection, returning its status """
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    status = int(lines[0].split()[1])
+    length = next(int(line.split(":")[1]) for line in lines if line.lower().startswith("content-length"))
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, request, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            if await read_response(reader) != 200:
+                errors.append(1)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run(args):
+    path = "/predict" if args.batch_size == 0 else "/predict_batch"
+    request = build_request(args.host, path, args.batch_size)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(*(
+        client(args.host, args.port, request, deadline, latencies, errors) for _ in range(args.concurrency)
+    ))
+
+    latencies_ms = np.array(latencies) * 1000
+    rows = max(args.batch_size, 1)
+    print(f"{path}: {len(latencies)} requests in {args.duration}s with {args.concurrency} connections")
+    print(f"QPS: {len(latencies) / args.duration:.0f}  rows/s: {len(latencies) * rows / args.duration:.0f}  "
+          f"errors: {len(errors)}")
+    print("Latency ms  p50: {:.2f}  p90: {:.2f}  p99: {:.2f}  max: {:.2f}".format(
+        *np.percentile(latencies_ms, [50, 90, 99]), latencies_ms.max()
+    ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the bikeshare prediction server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch-size", type=int, default=0, help="records per /predict_batch call, 0 uses /predict")
+    asyncio.run(run(parser.parse_args()))
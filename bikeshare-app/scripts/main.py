@@ -1,8 +1,7 @@
 # Main executing script for the program
-import pandas as pd
-
 from bikeshare.configs.config import CFGLog
 from bikeshare.model.bikeshare_model import BikeshareXGBoost
+from bikeshare.model.forecast_model import BikeshareForecaster
 from bikeshare.executor.inferrer import Inferrer
 
 
@@ -17,10 +16,26 @@ def run():
     # xgb_model = BikeshareXGBoost(config)
     # xgb_model.load_data()
     # xgb_model.build()
+    # xgb_model.search()
+    # xgb_model.cross_validate()
     # xgb_model.train()
     # xgb_model.evaluate()
     # xgb_model.export_model()
     
+    # Daily refresh: append the new hourly rows and add trees to the latest exported model
+    # xgb_model = BikeshareXGBoost(config)
+    # xgb_model.update(new_rows)
+    # xgb_model.export_model()
+    
+    # Station forecasts: the next forecasting.horizon hours of every station
+    # forecaster = BikeshareForecaster(config)
+    # forecaster.load_data()
+    # forecaster.build()
+    # forecaster.train()
+    # forecaster.evaluate()
+    # forecaster.export_model()
+    # forecasts = forecaster.forecast()
+    
     # new data:
     data_dict = {
         'hour': 0,
@@ -37,13 +52,11 @@ def run():
         'month': 'January'
     }
     
-    data_df = pd.DataFrame([data_dict])
-    
     # Inferrer
     inferrer = Inferrer()
     
-    print("\nXGBoost Prediction: ", inferrer.xgb_infer(data_df))
-    print("\nXGBoost Feature Importance: ", inferrer.xgb_feature_importance())
+    print("\nXGBoost Prediction: ", inferrer.infer_record(data_dict))
+    print("\nXGBoost Feature Importance: ", inferrer.xgb_named_feature_importance())
     
     print("----------------------------------")
     
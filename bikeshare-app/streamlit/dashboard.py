@@ -6,7 +6,8 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 
-from utils.dashboard_utils import get_bikeshare_data, preprocess_data, total_month_rentals_df, get_weekly_rentals_df, get_average_hourly_rentals_df, get_monthly_rentals_df, rentals_per_day, get_avg_temp_humidity
+from utils.dashboard_data import data_version, load_dashboard_data, get_month_rentals, get_day_rentals
+from utils.forecast import SEASONS, get_forecast_grid
 
 
 from bikeshare.utils.config import Config
@@ -15,6 +16,13 @@ from bikeshare.executor.inferrer import Inferrer
 import warnings
 warnings.filterwarnings('ignore')
 
+
+@st.cache_resource
+def get_inferrer():
+    # Shared across reruns and sessions, the model registry hot-swaps newly exported models
+    return Inferrer()
+
+
 def main():
     # Set wide page configuration
     st.set_page_config(
@@ -33,7 +41,10 @@ def main():
     
     # data, filtered_data = preprocess_data(raw_data)
     #input_df = pd.DataFrame([input_data])
-    inferrer = Inferrer()
+    inferrer = get_inferrer()
+    
+    # Parsed and aggregated once per version of the data file, widgets only look results up
+    dashboard_data = load_dashboard_data(data_version(), date_format=config.data.date_format)
     
     st.header("Bikeshare Rental Analytics", divider="blue")
     st.markdown("""
@@ -42,7 +53,7 @@ def main():
     """)
 
     with st.expander("See Raw Data"):
-        raw_data = get_bikeshare_data()
+        raw_data = dashboard_data.raw_data
         st.dataframe(raw_data)
     
     # Key Metrics
@@ -50,16 +61,15 @@ def main():
     
     # Total Rentals
     
-    df, filtered_df = preprocess_data(raw_data)
-    total_rentals = int(df["rented_bike_count"].sum())
+    filtered_df = dashboard_data.daily_rentals
+    total_rentals = dashboard_data.total_rentals
     
     ## Average Monthly Rentals
-    monthly_avg = df.groupby('month')['rented_bike_count'].sum().reset_index()
-    monthly_mean = monthly_avg["rented_bike_count"].mean()
+    monthly_mean = dashboard_data.monthly_mean
     
     ## Peak Hour
-    peak_hour = df.groupby('hour')['rented_bike_count'].sum().idxmax()
-    min_hour = int(df.groupby('hour')['rented_bike_count'].sum().idxmin())
+    peak_hour = dashboard_data.peak_hour
+    min_hour = dashboard_data.min_hour
     
     with st.container():
         st.write("Key Metrics")
@@ -99,7 +109,7 @@ def main():
             with tab2:
                 overall_months, single_month = st.tabs(["All Months", "Particular Month"])
                 with overall_months:
-                    monthly_rentals_bar = total_month_rentals_df(df)
+                    monthly_rentals_bar = dashboard_data.monthly_totals
                     monthly_plot_bar = px.bar(monthly_rentals_bar, x="month", y="rented_bike_count", labels={"rented_bike_count": "Rented Bike Count", "month": "Month"},
                     title="Monthly Bike Rentals")
                     st.plotly_chart(monthly_plot_bar)
@@ -118,7 +128,7 @@ def main():
                         year = st.selectbox("Select Year", range(2017, 2019))
                     
                     st.info('Dates ranges between Dec-2017 and Nov-2018', icon="ℹ️")
-                    monthly_rentals_line = get_monthly_rentals_df(df, month_num, year)
+                    monthly_rentals_line = get_month_rentals(dashboard_data, month_num, year)
                     monthly_plot_line = px.line(
                         monthly_rentals_line,
                         x="date",
@@ -130,7 +140,7 @@ def main():
                 
                 
             with tab3:
-                weekly_rentals = get_weekly_rentals_df(df)
+                weekly_rentals = dashboard_data.weekly_rentals
                 weekly_plot = px.bar(weekly_rentals, x="year_week", y="total_rentals",
                 labels={"year_week": "Week", "total_rentals": "Total Rentals"},
                 title="Weekly Bike Rentals (Dec 2017 - Nov 2018)")
@@ -140,7 +150,7 @@ def main():
                 overall_days, single_day = st.tabs(["Mean All Hours", "Particular Day"])
                 
                 with overall_days:
-                    hourly_rentals = get_average_hourly_rentals_df(df)
+                    hourly_rentals = dashboard_data.hourly_rentals
                     hourly_plot = px.line(hourly_rentals, x="hour", y="rented_bike_count", labels={"hour": "Hour", "rented_bike_count": "Rented Bike Count"})
                     st.plotly_chart(hourly_plot)
                     
@@ -153,7 +163,7 @@ def main():
                         max_value=datetime.date(2019, 1, 1)
                     )
                     st.info('Dates ranges between Dec-2017 and Nov-2018 only and there are days when the serivce is closed. ', icon="ℹ️")
-                    per_hour_data = rentals_per_day(df, d.day, d.month, d.year)
+                    per_hour_data = get_day_rentals(dashboard_data, d)
                     per_hour_plot = px.line(per_hour_data, x="hour", y="rented_bike_count", labels={"hour": "Hour", "rented_bike_count": "Rented Bike Count"})
                     st.plotly_chart(per_hour_plot)
                     
@@ -163,7 +173,7 @@ def main():
             seasonal_tab, temp_tab, humidity_tab = st.tabs(["Seasonal Rentals", "Average Temp", "Average Humidity"])
             
             with seasonal_tab:
-                season_rentals = raw_data.groupby('seasons').agg(total=('rented_bike_count', 'sum'))
+                season_rentals = dashboard_data.seasonal_rentals
                 
                 fig, ax = plt.subplots(figsize=(15, 5))
                 
@@ -192,12 +202,71 @@ def main():
             
             
             with temp_tab:
-                avg_temp_hum_data = get_avg_temp_humidity()
+                avg_temp_hum_data = dashboard_data.temp_humidity
                 st.dataframe(avg_temp_hum_data[[ "avg_temperature"]], use_container_width=True)
                 
                 
             with humidity_tab:
                 st.dataframe(avg_temp_hum_data[["avg_humidity"]], use_container_width=True)
+    
+    
+    # What-if Forecast
+    #####################
+    
+    with st.container():
+        st.subheader("What-if Forecast", divider="blue")
+        st.markdown("Predicted rentals for every hour of the day across a range of weather scenarios.")
+        
+        grid_col, conditions_col = st.columns([1, 1])
+        with grid_col:
+            temp_range = st.slider("Temperature range (°C)", -20, 40, (-10, 35))
+            temperatures = list(range(temp_range[0], temp_range[1] + 1))
+            rainfall_levels = st.multiselect("Rainfall levels (mm)", [0.0, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 35.0], default=[0.0, 1.0, 5.0, 10.0])
+            seasons = st.multiselect("Seasons", list(SEASONS), default=list(SEASONS))
+            
+        with conditions_col:
+            month_col, day_col = st.columns(2)
+            with month_col:
+                forecast_month = st.selectbox("Month", ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"], key="forecast_month")
+            with day_col:
+                forecast_day = st.selectbox("Day", ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"], key="forecast_day")
+            holiday = st.radio("Holiday", ["No Holiday", "Holiday"], horizontal=True)
+            humidity = st.slider("Humidity (%)", 0, 100, 55)
+            wind_speed = st.slider("Wind speed (m/s)", 0.0, 8.0, 1.5)
+            
+        if not rainfall_levels or not seasons:
+            st.info("Select at least one rainfall level and one season", icon="ℹ️")
+        else:
+            conditions = {
+                "humidity": humidity,
+                "wind_speed": wind_speed,
+                "visibility": 2000,
+                "solar_rad": 0.0,
+                "snowfall": 0.0,
+                "holiday": holiday,
+                "day": forecast_day,
+                "month": forecast_month
+            }
+            # Every hour x temperature x rainfall x season combination scored at once and memoized
+            forecast = get_forecast_grid(inferrer, temperatures, sorted(rainfall_levels), seasons, conditions)
+            
+            season_col, rainfall_col = st.columns(2)
+            with season_col:
+                season = st.selectbox("Show season", seasons)
+            with rainfall_col:
+                rainfall = st.selectbox("Show rainfall (mm)", sorted(rainfall_levels))
+            
+            heatmap = px.imshow(
+                forecast[:, :, sorted(rainfall_levels).index(rainfall), seasons.index(season)],
+                x=temperatures,
+                y=list(range(24)),
+                origin="lower",
+                aspect="auto",
+                color_continuous_scale="Viridis",
+                labels={"x": "Temperature (°C)", "y": "Hour", "color": "Predicted Rentals"},
+                title=f"Predicted Rentals by Hour and Temperature ({season}, {rainfall} mm rain)"
+            )
+            st.plotly_chart(heatmap)
 
 
 
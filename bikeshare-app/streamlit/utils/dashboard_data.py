@@ -0,0 +1,125 @@
+import copy
+import io
+import os
+from typing import NamedTuple
+
+import pandas as pd
+import streamlit as st
+
+from utils.dashboard_utils import DATA_PATH, MONTH_MAP, RollupCube, preprocess_data
+
+# Bytes before the end of the loaded data compared to tell an appended file from a rewritten one
+FINGERPRINT_SIZE = 4096
+
+# Last loaded data per path with the file offset it was read up to, extended when the file only grew
+_latest = {}
+
+
+class DashboardData(NamedTuple):
+    """ Every aggregate the dashboard shows, computed once per data version and shared read-only by all sessions """
+    raw_data: pd.DataFrame
+    daily_rentals: pd.DataFrame
+    total_rentals: int
+    monthly_mean: float
+    peak_hour: int
+    min_hour: int
+    monthly_totals: pd.DataFrame
+    weekly_rentals: pd.DataFrame
+    hourly_rentals: pd.DataFrame
+    seasonal_rentals: pd.DataFrame
+    temp_humidity: pd.DataFrame
+    # Time-indexed hourly data and rollups the drill-downs slice and appends update
+    cube: RollupCube
+
+
+def data_version(path=DATA_PATH):
+    """ Identifies the current contents of the data file """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def summarize(raw_data, cube):
+    """ Dashboard figures from the cube's rollups, which only hold one row per period """
+    hourly_totals = cube.by_hour['sum']
+    month_totals = cube.month_totals()
+    monthly_totals = month_totals.reset_index()
+    monthly_totals['month'] = monthly_totals['month'].map(MONTH_MAP)
+    
+    return DashboardData(
+        raw_data=raw_data,
+        daily_rentals=cube.daily_totals(),
+        total_rentals=int(cube.daily.sum()),
+        monthly_mean=month_totals.mean(),
+        peak_hour=hourly_totals.idxmax(),
+        min_hour=int(hourly_totals.idxmin()),
+        monthly_totals=monthly_totals,
+        weekly_rentals=cube.weeks(),
+        hourly_rentals=cube.hour_means(),
+        seasonal_rentals=cube.season_totals(),
+        temp_humidity=cube.temp_humidity(),
+        cube=cube
+    )
+
+
+def build_dashboard_data(raw_data, date_format=None):
+    """ Parses the raw data once and precomputes the monthly, weekly, hourly, daily and seasonal rollups """
+    data, _ = preprocess_data(raw_data.copy(), date_format)
+    return summarize(raw_data, RollupCube(data))
+
+
+def extend_dashboard_data(dashboard_data, new_rows, date_format=None):
+    """ Adds newly arrived raw rows, updating only the periods they fall in; dashboard_data is left as is """
+    data, _ = preprocess_data(new_rows.copy(), date_format)
+    # append replaces the rollups it changes, so a shallow copy keeps the cached cube untouched for other sessions
+    cube = copy.copy(dashboard_data.cube).append(data)
+    raw_data = pd.concat([dashboard_data.raw_data, new_rows], ignore_index=True)
+    return summarize(raw_data, cube)
+
+
+def read_complete_lines(path, offset=0, fingerprint=b""):
+    """ Returns (bytes of the complete lines after offset, new offset, new fingerprint)
+    
+    None when the file no longer ends the loaded data with fingerprint, i.e. it was rewritten
+    """
+    with open(path, "rb") as inputfile:
+        if os.fstat(inputfile.fileno()).st_size < offset:
+            return None
+        inputfile.seek(offset - len(fingerprint))
+        if inputfile.read(len(fingerprint)) != fingerprint:
+            return None
+        content = inputfile.read()
+    # A partly written last line is left for the next load
+    end = content.rfind(b"\n") + 1
+    data = fingerprint + content[:end]
+    return content[:end], offset + end, data[-FINGERPRINT_SIZE:]
+
+
+@st.cache_resource(max_entries=1)
+def load_dashboard_data(version, path=DATA_PATH, date_format=None):
+    """ Loads and aggregates the data; a new data version replaces the cached one
+    
+    When the file only had rows appended since the last load, just those rows are read and aggregated
+    """
+    latest = _latest.get(path)
+    appended = read_complete_lines(path, *latest[1:]) if latest is not None else None
+    if appended is None:
+        content, offset, fingerprint = read_complete_lines(path)
+        dashboard_data = build_dashboard_data(pd.read_csv(io.BytesIO(content)), date_format)
+    else:
+        content, offset, fingerprint = appended
+        dashboard_data = latest[0]
+        if content:
+            new_rows = pd.read_csv(io.BytesIO(content), header=None, names=dashboard_data.raw_data.columns)
+            dashboard_data = extend_dashboard_data(dashboard_data, new_rows, date_format)
+    _latest[path] = (dashboard_data, offset, fingerprint)
+    return dashboard_data
+
+
+def get_month_rentals(dashboard_data, month_num, year):
+    """ Daily rentals of a month, empty when the month has no data """
+    return dashboard_data.cube.month(month_num, year)
+
+
+def get_day_rentals(dashboard_data, date):
+    """ Hourly rentals of a day, empty when the day has no data """
+    return dashboard_data.cube.day(date)
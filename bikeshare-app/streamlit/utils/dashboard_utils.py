@@ -5,17 +5,21 @@ import seaborn as sns
 import numpy as np
 
 
+DATA_PATH = r"data/SeoulBikeData_cleaned_cols.csv"
+MONTH_MAP = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'May', 6: 'Jun', 7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
+
+
 def get_bikeshare_data():
     
     # Load data
-    data = pd.read_csv(r"data/SeoulBikeData_cleaned_cols.csv")
+    data = pd.read_csv(DATA_PATH)
     
     return data
 
 
-def preprocess_data(data):
-    # Convert date column to datetime format
-    data["date"] = pd.to_datetime(data["date"], dayfirst=True)
+def preprocess_data(data, date_format=None):
+    # Convert date column to datetime format, an explicit format avoids per-row format inference
+    data["date"] = pd.to_datetime(data["date"], dayfirst=True, format=date_format)
     
     # Extract day, month, and year
     data["day"] = data["date"].dt.day
@@ -41,8 +45,7 @@ def total_month_rentals_df(data):
     per_month_data = per_month_data.groupby('month')['rented_bike_count'].sum().reset_index()
     
     # Convert month number to month name for better visualization
-    month_map = {1: 'Jan', 2: 'Feb', 3: 'Mar', 4: 'Apr', 5: 'May', 6: 'Jun', 7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct', 11: 'Nov', 12: 'Dec'}
-    per_month_data['month'] = per_month_data['month'].map(month_map)  
+    per_month_data['month'] = per_month_data['month'].map(MONTH_MAP)  
     
     return per_month_data
 
@@ -50,9 +53,8 @@ def total_month_rentals_df(data):
 
 def get_monthly_rentals_df(data , month_num, year):
     
-    month_df = data.copy()
-    
-    selected_month = month_df[(month_df['month'] == month_num) & (month_df['year'] == year)]
+    # Boolean indexing already returns a new frame, no copy of the full data needed
+    selected_month = data[(data['month'] == month_num) & (data['year'] == year)]
     monthly_rentals = selected_month.groupby('date')['rented_bike_count'].sum().reset_index()
     monthly_rentals['day_of_week'] = monthly_rentals['date'].dt.day_name()
     
@@ -68,13 +70,12 @@ def get_monthly_rentals_df(data , month_num, year):
 
 def get_weekly_rentals_df(data):
     
-    week_data = data.copy()
-    # Group by month and sum rentals
+    # Group by week and sum rentals
     
     # week_data["week"] = week_data["data"].dt.isoclaendar().week
-    week_data["year_week"] = week_data["date"].dt.strftime('%Y-W%V')  # Create unique "year-week" label
+    year_week = data["date"].dt.strftime('%Y-W%V').rename('year_week')  # Create unique "year-week" label
     
-    weekly_rentals = week_data.groupby(['year_week']).agg(
+    weekly_rentals = data.groupby(year_week).agg(
         total_rentals=('rented_bike_count', 'sum')
     ).reset_index()
     
@@ -96,19 +97,19 @@ def get_average_hourly_rentals_df(data):
 
 def rentals_per_day(data, day, month, year):
     
-    hour_data = data.copy()
-    
-    hour_data = hour_data[(hour_data["day"] == day) & (hour_data["month"] == month) & (hour_data["year"] == year)]
+    hour_data = data[(data["day"] == day) & (data["month"] == month) & (data["year"] == year)]
     
     return hour_data
 
 
-def get_avg_temp_humidity():
+def get_avg_temp_humidity(data=None):
     
-    bike_data = get_bikeshare_data()
-    bike_data["date"] = pd.to_datetime(bike_data["date"], dayfirst=True)
+    # Reuses already preprocessed data when given instead of reading the csv again
+    if data is None:
+        data = get_bikeshare_data()
+        data["date"] = pd.to_datetime(data["date"], dayfirst=True)
     
-    temp_humidity = bike_data.copy()
+    temp_humidity = data.copy()
     
     temp_humidity["year_month"] = temp_humidity["date"].dt.strftime('%Y-%m')
     
@@ -117,4 +118,112 @@ def get_avg_temp_humidity():
     # set index to year_month
     averages.set_index('year_month', inplace=True)
     
-    return averages
\ No newline at end of file
+    return averages
+
+def week_labels(dates):
+    """ "year-week" label used by the weekly rollups """
+    return dates.strftime('%Y-W%V')
+
+
+def merge_rollup(rollup, delta):
+    """ Adds per-period totals of new rows to an existing rollup, touching only the periods in delta """
+    if rollup is None:
+        return delta.sort_index(kind='stable')
+    overlap = delta.index.intersection(rollup.index)
+    if len(overlap):
+        rollup = rollup.copy()
+        rollup.loc[overlap] += delta.loc[overlap]
+    merged = pd.concat([rollup, delta.drop(overlap)])
+    return merged if merged.index.is_monotonic_increasing else merged.sort_index(kind='stable')
+
+
+class RollupCube:
+    """ Hourly rentals indexed by a sorted DatetimeIndex, with additive daily, weekly, hourly, seasonal and
+    monthly weather rollups
+    
+    Drill-downs locate their rows with a binary search on the index and return slices of the hourly or
+    daily data instead of masking and copying the full frame. New hourly records are added with append,
+    which only updates the periods they fall in. Averages are kept as sums and counts so they can be updated
+    the same way.
+    """
+    
+    def __init__(self, data):
+        """ data is the output of preprocess_data """
+        self.hourly = data.iloc[0:0].set_index('datetime')
+        self.daily = self.weekly = self.by_hour = self.by_season = self.weather = None
+        self.append(data)
+    
+    def append(self, data):
+        """ Adds preprocessed hourly records, they may overlap or precede the ones already in the cube """
+        hourly = data.set_index('datetime')
+        if not hourly.index.is_monotonic_increasing:
+            hourly = hourly.sort_index(kind='stable')
+        
+        # The common case of records newer than everything stored only concatenates
+        in_order = not len(self.hourly) or not len(hourly) or hourly.index[0] >= self.hourly.index[-1]
+        self.hourly = pd.concat([self.hourly, hourly])
+        if not in_order:
+            self.hourly = self.hourly.sort_index(kind='stable')
+        
+        daily = hourly.groupby('date')['rented_bike_count'].sum()
+        weekly = daily.groupby(week_labels(daily.index).rename('year_week')).sum().rename('total_rentals')
+        by_hour = hourly.groupby('hour')['rented_bike_count'].agg(['sum', 'count'])
+        by_season = hourly.groupby('seasons')['rented_bike_count'].sum().rename('total')
+        weather = hourly.groupby(hourly['date'].dt.strftime('%Y-%m').rename('year_month')).agg(
+            temp=('temp', 'sum'), humidity=('humidity', 'sum'), count=('temp', 'count')
+        )
+        
+        self.daily = merge_rollup(self.daily, daily)
+        self.weekly = merge_rollup(self.weekly, weekly)
+        self.by_hour = merge_rollup(self.by_hour, by_hour)
+        self.by_season = merge_rollup(self.by_season, by_season)
+        self.weather = merge_rollup(self.weather, weather)
+        return self
+    
+    def between(self, index, start, end):
+        """ Positions [i, j) of the index entries within [start, end) """
+        return index.searchsorted(start, side='left'), index.searchsorted(end, side='left')
+    
+    def day(self, date):
+        """ Hourly rows of one day """
+        start = pd.Timestamp(date).normalize()
+        i, j = self.between(self.hourly.index, start, start + pd.Timedelta(days=1))
+        return self.hourly.iloc[i:j]
+    
+    def month(self, month_num, year):
+        """ Daily rentals of one month with the month's average per weekday, as in get_monthly_rentals_df """
+        start = pd.Timestamp(year=year, month=month_num, day=1)
+        i, j = self.between(self.daily.index, start, start + pd.DateOffset(months=1))
+        monthly_rentals = self.daily.iloc[i:j].reset_index()
+        monthly_rentals['day_of_week'] = monthly_rentals['date'].dt.day_name()
+        monthly_rentals['avg_rentals'] = monthly_rentals.groupby('day_of_week')['rented_bike_count'].transform('mean')
+        return monthly_rentals
+    
+    def weeks(self):
+        """ Total rentals per week, as in get_weekly_rentals_df """
+        return self.weekly.reset_index()
+    
+    def daily_totals(self):
+        """ Daily rentals of the days the service was used, as the filtered frame of preprocess_data """
+        daily = self.daily[self.daily != 0].to_frame()
+        daily.index.name = 'datetime'
+        return daily
+    
+    def month_totals(self):
+        """ Total rentals per calendar month over all years, by month number """
+        return self.daily.groupby(self.daily.index.month.rename('month')).sum()
+    
+    def hour_means(self):
+        """ Average rentals per hour of the day, as in get_average_hourly_rentals_df """
+        return (self.by_hour['sum'] / self.by_hour['count']).rename('rented_bike_count').reset_index()
+    
+    def season_totals(self):
+        """ Total rentals per season """
+        return self.by_season.to_frame()
+    
+    def temp_humidity(self):
+        """ Average temperature and humidity per month, as in get_avg_temp_humidity """
+        return pd.DataFrame({
+            'avg_temperature': self.weather['temp'] / self.weather['count'],
+            'avg_humidity': self.weather['humidity'] / self.weather['count']
+        })
@@ -0,0 +1,45 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+HOURS = tuple(range(24))
+SEASONS = ("Winter", "Spring", "Summer", "Autumn")
+
+
+def scenario_grid(temperatures, rainfall_levels, seasons, conditions):
+    """ One record per (hour, temperature, rainfall, season), every other feature fixed by conditions """
+    hour, temp, rainfall, season = np.meshgrid(
+        HOURS, temperatures, rainfall_levels, np.arange(len(seasons)), indexing="ij"
+    )
+    grid = pd.DataFrame({
+        "hour": hour.ravel(),
+        "temp": temp.ravel(),
+        "rainfall": rainfall.ravel(),
+        "seasons": np.asarray(seasons, dtype=object)[season.ravel()]
+    })
+    for name, value in conditions:
+        grid[name] = value
+    return grid
+
+
+@functools.lru_cache(maxsize=32)
+def forecast_grid(inferrer, model_key, temperatures, rainfall_levels, seasons, conditions):
+    """ Predicted rentals shaped (hour, temperature, rainfall, season), the whole grid scored in one call """
+    grid = scenario_grid(temperatures, rainfall_levels, seasons, conditions)
+    predictions = inferrer.infer_batch(grid).reshape(len(HOURS), len(temperatures), len(rainfall_levels), len(seasons))
+    # Cached and shared between sessions
+    predictions.setflags(write=False)
+    return predictions
+
+
+def get_forecast_grid(inferrer, temperatures, rainfall_levels, seasons, conditions):
+    """ Memoized by model and input tuple, so a scenario seen before is not scored again until a new model is saved """
+    return forecast_grid(
+        inferrer,
+        inferrer.xgb_current().key,
+        tuple(temperatures),
+        tuple(rainfall_levels),
+        tuple(seasons),
+        tuple(sorted(conditions.items()))
+    )
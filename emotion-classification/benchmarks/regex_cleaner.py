@@ -0,0 +1,69 @@
+# Benchmark of the special character cleaner on synthetic comments, run from emotion-classification/, e.g.
+#   python benchmarks/regex_cleaner.py --rows 1000000
+# Checks that every mode returns exactly the output of the original four re.sub calls before timing them
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from emotionClassification.dataloader.text_preprocessing import remove_patterns, remove_patterns_series
+
+WORDS = ["i", "the", "so", "this", "is", "not", "really", "love", "hate", "happy", "sad", "angry", "game", "lol",
+         "you're", "can't", "it's", "wow", "café", "naïve", "thanks", "what", "why", "people", "omg"]
+EXTRAS = ["https://example.com/r/a?b=1", "http://x.co", "[link](https://example.com)", "[a](b)", "@user",
+          "@someone_else", "!!", "?", "...", ":)", ",", "#tag", "&amp;", "@[x](y)z", "@userhttps://t.co/1"]
+
+
+def original_remove_patterns(text):
+    """The cleaner before it was precompiled, the reference output"""
+    text = re.sub(r"http[s]?://\S+", "", text)
+    text = re.sub(r"\[.*?\]\(.*?\)", "", text)
+    text = re.sub(r"@\w+", "", text)
+    text = re.sub(r"[^\w\s]", "", text)
+    return text.strip()
+
+
+def generate(rows, seed=0):
+    """Lowercased comments of Zipf-distributed words with links, handles and punctuation mixed in"""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(3, 40, rows)
+    ranks = np.minimum(rng.zipf(1.3, lengths.sum()), len(WORDS)) - 1
+    extras = rng.random(lengths.sum()) < 0.03
+    extra_choice = rng.integers(0, len(EXTRAS), lengths.sum())
+    tokens = np.where(extras, np.asarray(EXTRAS)[extra_choice], np.asarray(WORDS)[ranks])
+    return pd.Series([" ".join(comment) for comment in np.split(tokens, np.cumsum(lengths)[:-1])])
+
+
+def timed(fn, texts):
+    start = time.perf_counter()
+    result = fn(texts)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = generate(args.rows, args.seed)
+    print(f"{len(texts)} comments, {texts.str.len().sum() / 1e6:.1f}M characters")
+    modes = {
+        "original (4 x re.sub per comment)": lambda series: series.apply(original_remove_patterns),
+        "single pass per comment": lambda series: series.apply(remove_patterns),
+        "vectorized (Series.str.replace)": remove_patterns_series,
+    }
+    reference = None
+    for name, fn in modes.items():
+        result, seconds = timed(fn, texts)
+        if reference is None:
+            reference, baseline = result, seconds
+        elif not result.equals(reference):
+            raise SystemExit(f"{name} differs from the original on {(result != reference).sum()} comments")
+        print(f"{name:36s} {seconds:7.2f} s  {len(texts) / seconds:10,.0f} comments/s  {baseline / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
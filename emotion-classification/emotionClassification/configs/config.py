@@ -6,6 +6,15 @@ CFGLog = {
         "test_size": 0.2,
         "ngram_range": (1, 2),
         "random_state": 42,
+        # Preprocessed corpora, keyed by the hash of the raw comments; None preprocesses on every run
+        "cache_dir": "./data/cache/",
+        # Processes preprocessing the comments, None uses every core
+        "n_workers": None,
+        # Comments sent to a worker at a time
+        "chunksize": 5000,
+        # (word, POS) -> lemma cache shared by training and inference, None keeps it in memory only
+        "lemma_cache_path": "./data/cache/lemma_cache.json",
+        "lemma_cache_size": 1000000,
     },
     "train": {
         "solver": "liblinear",
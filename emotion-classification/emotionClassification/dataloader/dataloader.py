@@ -1,16 +1,21 @@
 import pandas as pd
 import numpy as np
-import re
 
 import nltk
 from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import wordnet
 
 from sklearn.model_selection import train_test_split
 
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+from emotionClassification.dataloader.lemma_cache import LemmaCache
+from emotionClassification.dataloader.text_preprocessing import (
+    TextPipeline,
+    TextPreprocessor,
+    get_wordnet_pos,
+    remove_patterns,
+)
+
 
 # nltk.download("punkt")
 # nltk.download("wordnet")
@@ -34,18 +39,6 @@ class DataLoader:
     @staticmethod
     def remove_special_characters(data_config, dataset=None):  # dataset -> df
         """Removes special characters from the text"""
-
-        def remove_patterns(text):
-            # Remove URLs
-            text = re.sub(r"http[s]?://\S+", "", text)
-            # Remove markdown-style links
-            text = re.sub(r"\[.*?\]\(.*?\)", "", text)
-            # Remove handles (that start with '@')
-            text = re.sub(r"@\w+", "", text)
-            # Remove punctuation and other special characters
-            text = re.sub(r"[^\w\s]", "", text)
-            return text.strip()
-
         dataset["lowercase_text"] = dataset["lowercase_text"].apply(remove_patterns)
 
         return dataset
@@ -60,26 +53,13 @@ class DataLoader:
     @staticmethod
     def lemmatize_text(data_config, dataset=None):
         """Lemmatizes the text"""
-
-        def get_wordnet_pos(word):
-            """Map POS tag to first character lemmatize() accepts"""
-            if word.startswith("J"):
-                return wordnet.ADJ
-            elif word.startswith("V"):
-                return wordnet.VERB
-            elif word.startswith("N"):
-                return wordnet.NOUN
-            elif word.startswith("R"):
-                return wordnet.ADV
-            else:
-                return wordnet.NOUN  # default to noun
-
-        lemmatizer = WordNetLemmatizer()
+        lemma_cache = DataLoader.load_lemma_cache(data_config)
         dataset["lemmatized_text"] = dataset["tokenized_text"].apply(
             lambda x: [
-                lemmatizer.lemmatize(w, get_wordnet_pos(t)) for w, t in nltk.pos_tag(x)
+                lemma_cache.lemmatize(w, get_wordnet_pos(t)) for w, t in nltk.pos_tag(x)
             ]
         )
+        DataLoader.save_lemma_cache(data_config, lemma_cache)
 
         # join back the tokens into a string
         dataset["lemmatized_text"] = dataset["lemmatized_text"].apply(
@@ -88,13 +68,49 @@ class DataLoader:
 
         return dataset
 
+    @staticmethod
+    def load_lemma_cache(data_config):
+        """The lemma cache saved by earlier runs, empty when there is none"""
+        return LemmaCache.load(data_config.lemma_cache_path, data_config.lemma_cache_size)
+
+    @staticmethod
+    def save_lemma_cache(data_config, lemma_cache):
+        """Saves the lemma cache for later runs and for the Inferrer, reporting its hit rate"""
+        stats = lemma_cache.stats()
+        print(
+            f"Lemma cache: {stats['hit_rate']:.1%} hit rate over {stats['hits'] + stats['misses']} "
+            f"tokens, {stats['entries']} entries"
+        )
+        if data_config.lemma_cache_path:
+            lemma_cache.save(data_config.lemma_cache_path)
+
+    @staticmethod
+    def load_text_pipeline(data_config):
+        """The text pipeline of a new model, starting from the saved lemma cache"""
+        return TextPipeline(DataLoader.load_lemma_cache(data_config))
+
+    @staticmethod
+    def clean_text(data_config, dataset=None, text_pipeline=None):
+        """Runs the four stages above fused per document, in parallel chunks, cached on disk by corpus hash"""
+        text_pipeline = text_pipeline or DataLoader.load_text_pipeline(data_config)
+        lemma_cache = text_pipeline.lemma_cache
+        preprocessor = TextPreprocessor(
+            n_workers=data_config.n_workers,
+            chunksize=data_config.chunksize,
+            cache_dir=data_config.cache_dir,
+            lemma_cache=lemma_cache,
+        )
+        dataset["lemmatized_text"] = preprocessor.preprocess(dataset[data_config.x])
+        if lemma_cache.hits + lemma_cache.misses:
+            DataLoader.save_lemma_cache(data_config, lemma_cache)
+
+        return dataset
+
     @staticmethod
     def preprocess_data(data_config, dataset=None):
         """Preprocesses the data and splits it into train and test sets"""
-        dataset = DataLoader.lowercase_text(data_config, dataset)
-        dataset = DataLoader.remove_special_characters(data_config, dataset)
-        dataset = DataLoader.tokenize_text(data_config, dataset)
-        dataset = DataLoader.lemmatize_text(data_config, dataset)
+        text_pipeline = DataLoader.load_text_pipeline(data_config)
+        dataset = DataLoader.clean_text(data_config, dataset, text_pipeline)
 
         x = dataset["lemmatized_text"]
         y = dataset[data_config.y]
@@ -133,4 +149,5 @@ class DataLoader:
             Y_train,
             Y_test,
             vectorizer,
+            text_pipeline,
         )
@@ -0,0 +1,118 @@
+"""Memoized lemmatization"""
+
+import json
+import os
+
+from nltk.stem import WordNetLemmatizer
+
+
+class LemmaCache:
+    """Bounded memo of WordNetLemmatizer.lemmatize keyed by (word, WordNet POS)
+
+    Word frequencies are Zipfian, so a small set of (word, POS) pairs covers most tokens and almost every
+    lemmatize call becomes a dict lookup. Lemmatization is deterministic, so the output is exactly that of the
+    lemmatizer. Once max_size pairs are cached new pairs are still lemmatized but no longer stored; the
+    frequent pairs are the ones seen first and stay cached. The cache can be saved to disk and loaded by
+    training and inference alike.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, max_size=1_000_000, track_new=False):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lemmas = {}
+        # Pairs added since the last drain_new, how worker processes report back what they learned. Only
+        # recorded with track_new, so other caches do not hold every pair twice
+        self.track_new = track_new
+        self._new = []
+        self._lemmatizer = None
+
+    def __getstate__(self):
+        """Pickles the entries only, the lemmatizer is recreated on first use"""
+        return {"max_size": self.max_size, "entries": self.entries()}
+
+    def __setstate__(self, state):
+        self.__init__(state["max_size"])
+        self.update(state["entries"])
+
+    def __len__(self):
+        return len(self._lemmas)
+
+    def lemmatize(self, word, pos):
+        """Same as WordNetLemmatizer().lemmatize(word, pos)"""
+        key = (word, pos)
+        lemma = self._lemmas.get(key)
+        if lemma is not None:
+            self.hits += 1
+            return lemma
+        self.misses += 1
+        if self._lemmatizer is None:
+            self._lemmatizer = WordNetLemmatizer()
+        lemma = self._lemmatizer.lemmatize(word, pos)
+        if len(self._lemmas) < self.max_size:
+            self._lemmas[key] = lemma
+            if self.track_new:
+                self._new.append((word, pos, lemma))
+        return lemma
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+    def entries(self):
+        """Every cached (word, pos, lemma)"""
+        return [(word, pos, lemma) for (word, pos), lemma in self._lemmas.items()]
+
+    def update(self, entries):
+        """Adds (word, pos, lemma) entries, e.g. the new pairs of a worker process, up to max_size"""
+        for word, pos, lemma in entries:
+            if len(self._lemmas) >= self.max_size:
+                break
+            if (word, pos) not in self._lemmas:
+                self._lemmas[(word, pos)] = lemma
+                if self.track_new:
+                    self._new.append((word, pos, lemma))
+        return self
+
+    def drain_new(self):
+        """Returns and forgets the entries added since the last call, always empty without track_new"""
+        new, self._new = self._new, []
+        return new
+
+    def merge_stats(self, hits, misses):
+        """Counts lookups made by another process's copy of the cache"""
+        self.hits += hits
+        self.misses += misses
+
+    def save(self, path):
+        """Writes the entries as JSON, under a temporary name first so readers never see a partial file"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w") as outputfile:
+            json.dump(
+                {"format_version": self.FORMAT_VERSION, "entries": self.entries()},
+                outputfile,
+            )
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, path, max_size=1_000_000):
+        """Loads a saved cache, or returns an empty one when there is none at path"""
+        cache = cls(max_size)
+        if path and os.path.isfile(path):
+            with open(path) as inputfile:
+                saved = json.load(inputfile)
+            if saved["format_version"] == cls.FORMAT_VERSION:
+                cache.update(saved["entries"])
+        return cache
@@ -0,0 +1,226 @@
+"""Fused, parallel and cached text preprocessing"""
+
+import hashlib
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import nltk
+import pandas as pd
+from nltk.corpus import wordnet
+from nltk.tokenize import word_tokenize
+
+from emotionClassification.dataloader.lemma_cache import LemmaCache
+
+# Part of the cache key, bump it whenever the output of preprocess_document changes
+PIPELINE_VERSION = 1
+
+# Lemma cache of the current process, seeded from the main process's cache in worker processes
+_lemma_cache = None
+
+
+def get_wordnet_pos(tag):
+    """Map POS tag to first character lemmatize() accepts"""
+    if tag.startswith("J"):
+        return wordnet.ADJ
+    elif tag.startswith("V"):
+        return wordnet.VERB
+    elif tag.startswith("N"):
+        return wordnet.NOUN
+    elif tag.startswith("R"):
+        return wordnet.ADV
+    else:
+        return wordnet.NOUN  # default to noun
+
+
+# Removed from the text in this order: URLs, markdown-style links, handles (that start with '@'), then
+# punctuation and other special characters
+PATTERNS = (
+    re.compile(r"http[s]?://\S+"),
+    re.compile(r"\[.*?\]\(.*?\)"),
+    re.compile(r"@\w+"),
+    re.compile(r"[^\w\s]"),
+)
+# All four in a single pass. Matching the alternation left to right gives the same text as the four passes
+# unless one removal changes what a later pattern sees: a handle running into a URL or markdown link
+# ("@userhttp://...", "@[a](b)c", whose handle only exists once the link is gone), or a URL inside or across
+# a markdown link ("[a](http://...)", whose URL pass eats the closing parenthesis).
+_SINGLE_PASS = re.compile("|".join(pattern.pattern for pattern in PATTERNS))
+_HANDLE_BEFORE_LINK = re.compile(r"@\w*(?:https?://|\[)")
+
+
+def needs_ordered_passes(text):
+    """Whether a removal in text can change what a later pattern sees, see _SINGLE_PASS"""
+    return ("[" in text and "http" in text) or _HANDLE_BEFORE_LINK.search(text) is not None
+
+
+def remove_patterns(text):
+    """Removes URLs, markdown links, handles and special characters"""
+    if needs_ordered_passes(text):
+        for pattern in PATTERNS:
+            text = pattern.sub("", text)
+    else:
+        text = _SINGLE_PASS.sub("", text)
+    return text.strip()
+
+
+def remove_patterns_series(texts):
+    """remove_patterns over a whole Series with vectorized str methods
+
+    Gives the same output as Series.apply(remove_patterns), which is as fast or faster while pandas runs
+    compiled patterns element by element (see benchmarks/regex_cleaner.py)
+    """
+    # Not str.contains, which may run _HANDLE_BEFORE_LINK with another regex engine's (ASCII) \w
+    ordered = texts.map(needs_ordered_passes).astype(bool)
+    cleaned = texts.copy()
+    # Compiled patterns make str.replace keep Python's re semantics (Unicode \w and \s)
+    cleaned[~ordered] = texts[~ordered].str.replace(_SINGLE_PASS, "", regex=True)
+    if ordered.any():
+        sequential = texts[ordered]
+        for pattern in PATTERNS:
+            sequential = sequential.str.replace(pattern, "", regex=True)
+        cleaned[ordered] = sequential
+    return cleaned.str.strip()
+
+
+def default_lemma_cache():
+    """The process-wide lemma cache"""
+    global _lemma_cache
+    if _lemma_cache is None:
+        _lemma_cache = LemmaCache()
+    return _lemma_cache
+
+
+def preprocess_document(text, lemma_cache=None):
+    """Lowercases, cleans, tokenizes and lemmatizes one document in a single pass
+
+    Gives the same string as DataLoader's lowercase_text, remove_special_characters, tokenize_text and
+    lemmatize_text stages run one after the other
+    """
+    lemmatize = (lemma_cache if lemma_cache is not None else default_lemma_cache()).lemmatize
+    tokens = word_tokenize(remove_patterns(text.lower()))
+    return " ".join(lemmatize(word, get_wordnet_pos(tag)) for word, tag in nltk.pos_tag(tokens))
+
+
+def preprocess_chunk(texts, lemma_cache=None):
+    """Preprocesses a list of documents"""
+    return [preprocess_document(text, lemma_cache) for text in texts]
+
+
+def _init_worker(entries, max_size):
+    global _lemma_cache
+    # Seeded before tracking starts, so only the pairs this worker adds are sent back
+    _lemma_cache = LemmaCache(max_size).update(entries)
+    _lemma_cache.track_new = True
+
+
+def _preprocess_chunk_in_worker(texts):
+    """The unit of work sent to a worker process, returns the lemma pairs and lookups it added too"""
+    cache = default_lemma_cache()
+    hits, misses = cache.hits, cache.misses
+    documents = preprocess_chunk(texts, cache)
+    return documents, cache.drain_new(), cache.hits - hits, cache.misses - misses
+
+
+def corpus_hash(texts):
+    """Hash of the raw documents and of the preprocessing version, identifying a cleaned corpus"""
+    digest = hashlib.sha256(f"v{PIPELINE_VERSION}".encode())
+    digest.update(pd.util.hash_pandas_object(pd.Series(texts), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class TextPipeline:
+    """The text preprocessing of a model, saved with it so inference cleans documents the way training did
+
+    clean is the low-latency path for a single document: str and re calls and lemma cache lookups, no pandas.
+    The lemma cache is saved with the pipeline, so inference starts with every lemma training needed.
+    """
+
+    def __init__(self, lemma_cache=None):
+        self.version = PIPELINE_VERSION
+        self.lemma_cache = lemma_cache if lemma_cache is not None else LemmaCache()
+
+    def clean(self, document):
+        """Same as the lemmatized_text DataLoader.preprocess_data trains on"""
+        return preprocess_document(document, self.lemma_cache)
+
+    def transform(self, documents):
+        """Cleans an iterable of documents"""
+        return [self.clean(document) for document in documents]
+
+
+class TextPreprocessor:
+    """Runs preprocess_document over a corpus in chunks on a process pool and caches the result on disk
+
+    Chunks are submitted with at most two per worker in flight, so a streamed corpus is never held in memory
+    as a whole. The cleaned corpus is stored under cache_dir keyed by corpus_hash, so a corpus is only
+    preprocessed once. Workers start from a copy of lemma_cache and send the lemmas they add back with each
+    chunk, so lemma_cache ends up with every pair the corpus needed.
+    """
+
+    def __init__(self, n_workers=None, chunksize=5000, cache_dir=None, lemma_cache=None):
+        self.n_workers = n_workers or os.cpu_count()
+        self.chunksize = chunksize
+        self.cache_dir = cache_dir
+        self.lemma_cache = lemma_cache if lemma_cache is not None else LemmaCache()
+
+    def chunks(self, texts):
+        chunk = []
+        for text in texts:
+            chunk.append(text)
+            if len(chunk) == self.chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def iter_preprocess(self, texts):
+        """Yields the cleaned documents of any iterable of documents, in order"""
+        if self.n_workers == 1:
+            for chunk in self.chunks(texts):
+                yield from preprocess_chunk(chunk, self.lemma_cache)
+            return
+        with ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            initializer=_init_worker,
+            initargs=(self.lemma_cache.entries(), self.lemma_cache.max_size),
+        ) as executor:
+            pending = deque()
+            for chunk in self.chunks(texts):
+                pending.append(executor.submit(_preprocess_chunk_in_worker, chunk))
+                if len(pending) >= 2 * self.n_workers:
+                    yield from self.collect(pending.popleft())
+            while pending:
+                yield from self.collect(pending.popleft())
+
+    def collect(self, future):
+        """Merges the lemmas and lookups of a finished chunk into lemma_cache, returns its documents"""
+        documents, entries, hits, misses = future.result()
+        self.lemma_cache.update(entries)
+        self.lemma_cache.merge_stats(hits, misses)
+        return documents
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_dir, f"corpus_{key}.csv")
+
+    def preprocess(self, texts):
+        """Returns the cleaned documents as a Series aligned with texts, from the cache when available"""
+        texts = pd.Series(texts)
+        if not self.cache_dir:
+            return pd.Series(list(self.iter_preprocess(texts)), index=texts.index)
+
+        path = self.cache_path(corpus_hash(texts))
+        if os.path.isfile(path):
+            print(f"Loaded preprocessed corpus from {path}")
+            # Documents that clean to nothing are stored as empty fields, which must not become NaN
+            cleaned = pd.read_csv(path, dtype=str, keep_default_na=False)["text"]
+            return pd.Series(cleaned.to_numpy(), index=texts.index)
+
+        cleaned = pd.Series(list(self.iter_preprocess(texts)), index=texts.index)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Written under a temporary name first so an interrupted run never leaves a partial cache
+        cleaned.to_frame("text").to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        print(f"Saved preprocessed corpus to {path}")
+        return cleaned
@@ -1,5 +1,12 @@
 from emotionClassification.utils.config import Config
 from emotionClassification.configs.config import CFGLog
+from emotionClassification.dataloader.lemma_cache import LemmaCache
+from emotionClassification.dataloader.text_preprocessing import (
+    PIPELINE_VERSION,
+    TextPipeline,
+    TextPreprocessor,
+)
+from itertools import islice
 import os
 import pickle
 
@@ -14,11 +21,26 @@ class Inferrer:
         self.files = os.listdir(self.config.output.output_path)
         
         with open(self.saved_path, "rb") as f:
-            self.vectorizer, self.model = pickle.load(f)
+            saved = pickle.load(f)
+        self.vectorizer, self.model = saved[:2]
+        self.text_pipeline = saved[2] if len(saved) > 2 else None
+        if self.text_pipeline is None:
+            # Models saved without a pipeline were trained on the lemmatized text as well
+            self.text_pipeline = TextPipeline(
+                LemmaCache.load(
+                    self.config.data.lemma_cache_path,
+                    self.config.data.lemma_cache_size,
+                )
+            )
+        elif self.text_pipeline.version != PIPELINE_VERSION:
+            print(
+                f"Warning: {self.saved_path} was trained with text pipeline version "
+                f"{self.text_pipeline.version}, this code runs version {PIPELINE_VERSION}"
+            )
 
     def preprocess(self, document: str):
-        """Converts input document string to embeddings by the trained vectorizer"""
-        return self.vectorizer.transform([document])
+        """Cleans the input document like the training data and converts it to embeddings by the trained vectorizer"""
+        return self.vectorizer.transform([self.text_pipeline.clean(document)])
 
     def infer(self, document):
         """Converts input document string to embeddings and infer emotion result"""
@@ -26,3 +48,28 @@ class Inferrer:
         predicted_emotion = self.model.predict(document_embeddings)
         print(f"Model in use: {self.saved_path}")
         return predicted_emotion
+
+    def infer_batch(self, documents, batch_size=10000, n_workers=1):
+        """Infers the emotions of an iterable of documents batch by batch
+
+        documents may be a generator, e.g. streaming a comment dump from disk, only one batch is held at a
+        time. Each batch is vectorized into one sparse matrix and scored with a single predict_proba call, the
+        labels are the most probable classes. n_workers other than 1 cleans the documents on a process pool
+        (None uses every core). Yields (predicted_emotions, probabilities) per batch, the probability columns
+        ordered as model.classes_.
+        """
+        print(f"Model in use: {self.saved_path}")
+        if n_workers == 1:
+            cleaned = (self.text_pipeline.clean(document) for document in documents)
+        else:
+            cleaned = TextPreprocessor(
+                n_workers=n_workers,
+                chunksize=min(batch_size, self.config.data.chunksize),
+                lemma_cache=self.text_pipeline.lemma_cache,
+            ).iter_preprocess(documents)
+        while True:
+            batch = list(islice(cleaned, batch_size))
+            if not batch:
+                return
+            probabilities = self.model.predict_proba(self.vectorizer.transform(batch))
+            yield self.model.classes_[probabilities.argmax(axis=1)], probabilities
@@ -30,6 +30,7 @@ class EmotionLogisticRegression(BaseModel):
             self.Y_train,
             self.Y_test,
             self.vectorizer,
+            self.text_pipeline,
         ) = DataLoader().preprocess_data(
             data_config=self.config.data, dataset=self.dataset
         )
@@ -70,15 +71,14 @@ class EmotionLogisticRegression(BaseModel):
     def evaluate_documnet(self, document: str):
         """Predicts the rating for an input string given a trained model"""
         document_embeddings = self.vectorizer.transform(
-            [document]
+            [self.text_pipeline.clean(document)]
         )  # vectorizer expects a list of strings
-        return self.model.predict_proba(document_embeddings), self.model.predict(
-            document_embeddings
-        )
+        probabilities = self.model.predict_proba(document_embeddings)
+        return probabilities, self.model.classes_[probabilities.argmax(axis=1)]
 
     def export_model(self):
         """Exports the custom model's sklearn linear model"""
         output_config = self.config.output.output_path
         ModelSaving().save_model_with_timestamp(
-            self.vectorizer, self.model, output_config
+            self.vectorizer, self.model, output_config, self.text_pipeline
         )
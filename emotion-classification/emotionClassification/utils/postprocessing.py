@@ -9,13 +9,16 @@ class ModelSaving(object):
         return datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
     @staticmethod
-    def save_model_with_timestamp(vectorizer, model, output_config):
+    def save_model_with_timestamp(vectorizer, model, output_config, text_pipeline=None):
         filename = ModelSaving.get_current_timestamp() + "_LogReg" + ".pickle"
         filepath = os.path.join(output_config, filename)
         with open(filepath, "wb") as outputfiile:
-            pickle.dump((vectorizer, model), outputfiile)
+            # The text pipeline comes last, so (vectorizer, model) = saved[:2] still works
+            pickle.dump((vectorizer, model, text_pipeline), outputfiile)
 
-        return print(f"Saved vectorizer and model to pickle file at {filepath}")
+        return print(
+            f"Saved vectorizer, model and text pipeline to pickle file at {filepath}"
+        )
 
 
 if __name__ == "__main__":
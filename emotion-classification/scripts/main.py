@@ -27,6 +27,12 @@ def run():
     inferrer = Inferrer()
     print(inferrer.infer(document_angry))
 
+    # # Batch inference, e.g. over a comment dump streamed from disk one comment per line
+    # with open("./data/comments.txt") as comments:
+    #     documents = (line.rstrip("\n") for line in comments)
+    #     for emotions, probabilities in inferrer.infer_batch(documents, batch_size=10000):
+    #         print(emotions[:10], probabilities[:10])
+
 
 if __name__ == "__main__":
     run()